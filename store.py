@@ -1,5 +0,0 @@
-import os
-import redis
-
-redis_url = os.getenv('REDISTOGO_URL', 'redis://localhost:6379')
-redis = redis.from_url(redis_url)
@@ -14,16 +14,29 @@ var App = new (Backbone.View.extend({
 
     events: {
         'click a[href="/add"]': 'showToDoForm',
+        'click a[href="/check-all"]': 'checkAll',
         'click a[href="/now"]': 'route',
         'click a[href="/later"]': 'route',
         'click a[href="/done"]': 'route',
     },
 
     start: function () {
+        // The page embeds the first response for the list of tasks in progress, so it isn't requested again.
+        var bootstrapped = $('#bootstrap-tasks');
+        this.bootstrapped = bootstrapped.length ? JSON.parse(bootstrapped.html()) : null;
+        // Every task of the user's, loaded once and then kept up to date with the changes since its version.
+        this.tasks = new this.Collections.ToDoList();
+        this.version = null;
+        this.bootstrappedVersion = null;
         this.toDoList = new this.Collections.ToDoList();
         var toDoListView = new this.Views.ToDoList({ collection: this.toDoList, el: $('#to-do-list') });
         this.router = new this.ToDoRouter();
         Backbone.history.start({ pushState: true });
+        // Catch up with changes made in other tabs and on other devices as the server announces them.
+        if (window.EventSource) {
+            this.events = new EventSource('/events/');
+            this.events.addEventListener('version', _.bind(this.receiveVersion, this));
+        }
     },
 
     getListName: function () {
@@ -37,14 +50,88 @@ var App = new (Backbone.View.extend({
         console.log(Backbone.history);
     },
 
+    // Which of the user's tasks each list shows, the same way as the server's lists: archived reminders are done for good.
+    listFilters: {
+        now: function (toDoItem) { return toDoItem.get('current'); },
+        later: function (toDoItem) {
+            return !toDoItem.get('current') && !(toDoItem.get('archived') && !toDoItem.get('repeatable'));
+        },
+        done: function (toDoItem) {
+            return toDoItem.get('done') || toDoItem.get('archived') && !toDoItem.get('repeatable');
+        }
+    },
+
+    // Show the list from the loaded tasks, loading every task the first time and only the changes after that.
     setList: function (listName) {
-        this.toDoList.fetch({ url: '/api/todo/' + listName,
+        this.listName = listName;
+        if (listName === 'now' && this.bootstrapped) {
+            this.toDoList.reset(this.bootstrapped.objects);
+            this.bootstrappedVersion = this.bootstrapped.meta.version;
+            this.bootstrapped = null;
+        } else if (this.version === null) {
+            this.loadTasks();
+        } else {
+            this.syncTasks();
+        }
+    },
+
+    // Load every task one page at a time, starting over unless given the cursor of the next page.
+    loadTasks: function (cursor) {
+        this.tasks.fetch({ url: '/api/tasks/',
+            data: cursor ? { after: cursor } : {},
+            remove: !cursor,
             success: _.bind(function (collection, response, options) {
-                this.toDoList.set(response.objects);
+                if (!cursor)
+                    this.version = response.meta.version;
+                if (response.meta.next)
+                    this.loadTasks(response.meta.next);
+                else
+                    this.showList();
             }, this)
         });
     },
 
+    // Apply the changes since the loaded version, or load every task again if the server no longer has them.
+    syncTasks: function () {
+        $.getJSON('/api/tasks/changes/', { since: this.version }, _.bind(function (response) {
+            if (response.meta.reset)
+                return this.loadTasks();
+            this.tasks.set(response.objects, { remove: false });
+            this.tasks.remove(response.meta.deleted);
+            this.version = response.meta.version;
+            this.showList();
+        }, this));
+    },
+
+    // Load what changed when the server announces a newer version than the one shown.
+    receiveVersion: function (e) {
+        var version = parseInt(e.data, 10);
+        if (this.version !== null) {
+            if (version > this.version)
+                this.syncTasks();
+        } else if (this.bootstrappedVersion !== null && version > this.bootstrappedVersion) {
+            this.bootstrappedVersion = null;
+            this.loadTasks();
+        }
+    },
+
+    showList: function () {
+        this.toDoList.set(this.tasks.filter(this.listFilters[this.listName]));
+    },
+
+    // Mark every unchecked item in the shown list done with a single request.
+    checkAll: function (e) {
+        e.preventDefault();
+        var unchecked = this.toDoList.reject(function (toDoItem) { return toDoItem.get('done'); });
+        if (!unchecked.length)
+            return;
+        // The bootstrapped list is shown before every task is loaded, so update its items in place until then.
+        if (this.version === null)
+            this.toDoList.saveStates(unchecked, { done: true });
+        else
+            this.tasks.saveStates(unchecked, { done: true }).done(_.bind(this.showList, this));
+    },
+
     showToDoForm: function (e) {
         e.preventDefault();
         var toDoItem = new this.Models.ToDoItem();
@@ -120,31 +207,36 @@ App.Collections.ToDoList = Backbone.Collection.extend({
     url: '/api/todo',
 
     initialize: function () {
-        // Iterate over each todo item that has already been rendered and attach models and views to them.
-        _.each($('.to-do-item'), function (toDoItemElement) {
-            var id = $(toDoItemElement).data('id');
-            var titleElement = $(toDoItemElement).children('span.title')[0];
-            var title = $(titleElement).text();
-            var done = $(toDoItemElement).children('input').is(':checked');
-            var doneTime = (new Date($(toDoItemElement).data('done-time')));
-            var toDoItem = new App.Models.ToDoItem({
-                id: id,
-                title: title,
-                done: done,
-                doneTime: doneTime
-            });
-            this.add(toDoItem);
-            var toDoItemView = new App.Views.ToDoItem({
-                model: toDoItem,
-                el: toDoItemElement
-            });
-        }, this);
         this.on('destroy', this.remove, this);
         this.on('change', this.log, this);
         this.on('destroy', this.log, this);
         this.on('sync', this.log, this);
     },
 
+    // List responses wrap tasks in 'objects' alongside paging info in 'meta'.
+    parse: function (response) {
+        return response.objects;
+    },
+
+    // Mark many todo items current or done with a single request, e.g. checking all items at once.
+    saveStates: function (toDoItems, attrs) {
+        var changes = _.map(toDoItems, function (toDoItem) {
+            return _.extend({ id: toDoItem.id }, attrs);
+        });
+        return Backbone.sync('create', this, {
+            url: '/api/tasks/batch/',
+            attrs: { objects: changes },
+            success: _.bind(function (response) {
+                this.set(response.objects, { remove: false });
+                // Each changed item was saved, so let its view render the new state.
+                _.each(response.objects, function (attrs) {
+                    var toDoItem = this.get(attrs.id);
+                    toDoItem.trigger('sync', toDoItem, attrs);
+                }, this);
+            }, this)
+        });
+    },
+
     // Logging to inspect models in the collection after each successful change with the server.
     log: function () {
         console.log('-----------');
@@ -167,17 +259,17 @@ App.Views.ToDoItem = Backbone.View.extend({
     },
 
     // Normal state template for todo item
-    itemTemplate: Handlebars.compile('<label>' +
+    itemTemplate: _.template('<label>' +
         '<input type="checkbox" ' +
-        '{{#if done}}checked {{/if}}/>' +
-        '<span class="title">{{title}}</span>' +
+        '<% if (done) { %>checked <% } %>/>' +
+        '<span class="title"><%- title %></span>' +
         '<a class="delete" href="#">Delete</a>' +
         '</label>'
     ),
 
     // Editing state template for todo item
-    editorTemplate: Handlebars.compile('<form class="to-do-editor">' +
-        '<input class="edit" type="text" value="{{title}}" />' +
+    editorTemplate: _.template('<form class="to-do-editor">' +
+        '<input class="edit" type="text" value="<%- title %>" />' +
         '</form>'
     ),
 
@@ -249,6 +341,13 @@ App.Views.ToDoList = Backbone.View.extend({
 
     initialize: function () {
         this.listenTo(this.collection, 'add', this.addItem);
+        this.listenTo(this.collection, 'reset', this.render);
+    },
+
+    render: function () {
+        this.$el.empty();
+        this.collection.each(this.addItem, this);
+        return this;
     },
 
     addItem: function (toDoItem) {
@@ -299,15 +398,9 @@ App.Views.ToDoForm = Backbone.View.extend({
         this.model.save(this.serialize(), {
             success: _.bind(function (model, response, options) {
                 this.close();
-                var listName = App.getListName();
-                var current = model.get('current');
-                var done = model.get('done');
-                if (listName === 'now' && current ||
-                    listName === 'later' && !current ||
-                    listName === 'done' && done)
-                {
+                App.tasks.add(model);
+                if (App.listFilters[App.getListName()](model))
                     App.toDoList.add(model);
-                }
             }, this),
             error: function (model, xhr, options) {
                 console.log('Problem saving model: ' + model);
@@ -0,0 +1,30 @@
+"""Gunicorn configuration for the web process.
+
+Runs gevent workers by default, so a worker waiting on Redis or Postgres \
+serves other requests instead of blocking. Each worker handles up to \
+``GUNICORN_WORKER_CONNECTIONS`` concurrent requests in greenlets, and \
+``WEB_CONCURRENCY`` sets the number of worker processes.
+
+Set ``GUNICORN_WORKER_CLASS=sync`` to fall back to one request per worker.
+
+"""
+import os
+
+bind = '0.0.0.0:{port}'.format(port=os.getenv('PORT', '8000'))
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+
+def post_fork(server, worker):
+    """Makes psycopg2 yield to other greenlets while waiting on Postgres.
+
+    Gevent workers patch sockets, which covers Redis, but psycopg2 talks \
+    to Postgres through libpq and needs a wait callback to cooperate.
+
+    """
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
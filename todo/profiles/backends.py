@@ -0,0 +1,35 @@
+"""Authentication backend that caches users in Redis.
+
+``AuthenticationMiddleware`` loads the logged in user on every request. \
+``CachedModelBackend`` keeps each loaded user in Redis for \
+``USER_CACHE_TIMEOUT`` seconds, so most requests don't query the user \
+table. Cached users are dropped whenever a user is saved, which includes \
+password changes, or deleted.
+
+"""
+import cPickle as pickle
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from todo.redis_client import get_client
+
+def user_cache_key(user_id):
+    """Returns the Redis key for the given user's cached model instance."""
+    return 'profiles:user:{user_id}'.format(user_id=user_id)
+
+def uncache_user(sender, instance, **kwargs):
+    """Drops the cached copy of a saved or deleted user."""
+    get_client().delete(user_cache_key(instance.pk))
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        client = get_client()
+        cached_user = client.get(user_cache_key(user_id))
+        if cached_user is not None:
+            return pickle.loads(cached_user)
+        user = super(CachedModelBackend, self).get_user(user_id)
+        if user is not None:
+            client.set(user_cache_key(user_id), pickle.dumps(user, pickle.HIGHEST_PROTOCOL),
+                       ex=settings.USER_CACHE_TIMEOUT)
+        return user
@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+
+from .backends import uncache_user
 
 class UserManager(BaseUserManager):
     def create_user(self, email, name, password):
@@ -64,6 +67,10 @@ class User(AbstractBaseUser):
     def __unicode__(self):
         return self.email
 
+# Cached users are dropped whenever they change, including password changes.
+post_save.connect(uncache_user, sender=User)
+post_delete.connect(uncache_user, sender=User)
+
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL)
     timezone = models.CharField(max_length=50)
@@ -0,0 +1,61 @@
+"""Session engine that keeps sessions in Redis.
+
+Set ``SESSION_ENGINE = 'profiles.sessions'`` to use it. Sessions are \
+stored under ``session:<key>`` through the connection pool in \
+``REDIS_POOL`` and expire with the session, so there's nothing for \
+``clearsessions`` to clean up.
+
+"""
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+
+from todo.redis_client import get_client
+
+def session_key_name(session_key):
+    """Returns the Redis key for the data of the session with the given key."""
+    return 'session:{session_key}'.format(session_key=session_key)
+
+class SessionStore(SessionBase):
+    def __init__(self, session_key=None):
+        super(SessionStore, self).__init__(session_key)
+        self.client = get_client()
+
+    def load(self):
+        session_data = self.client.get(session_key_name(self.session_key)) if self.session_key else None
+        if session_data is not None:
+            return self.decode(session_data)
+        self.create()
+        return {}
+
+    def exists(self, session_key):
+        return self.client.exists(session_key_name(session_key))
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                # The key was taken in the meantime, so try another.
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session_data = self.encode(self._get_session(no_load=must_create))
+        stored = self.client.set(session_key_name(self.session_key), session_data,
+                                 ex=self.get_expiry_age(), nx=must_create)
+        if must_create and not stored:
+            raise CreateError
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.client.delete(session_key_name(session_key))
+
+    @classmethod
+    def clear_expired(cls):
+        pass
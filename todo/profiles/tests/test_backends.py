@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import redis
+
+from todo.redis_client import get_client
+
+from ..backends import CachedModelBackend, user_cache_key
+from ..sessions import SessionStore
+
+@override_settings(
+    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+)
+class CachedModelBackendTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.backend = CachedModelBackend()
+
+    def tearDown(self):
+        get_client().flushdb()
+
+    def test_user_cached(self):
+        """Loads a user twice and checks that only the first load queries the database."""
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk).email, 'test@test.com')
+
+    def test_saved_user_uncached(self):
+        """Changes a cached user's password and checks that the user is loaded with the new password."""
+        self.backend.get_user(self.user.pk)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertTrue(self.backend.get_user(self.user.pk).check_password('changed'))
+
+    def test_missing_user_not_cached(self):
+        """Loads a user that doesn't exist and checks that nothing is cached."""
+        self.assertEqual(self.backend.get_user(0), None)
+        self.assertEqual(get_client().get(user_cache_key(0)), None)
+
+@override_settings(
+    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+)
+class SessionStoreTest(TestCase):
+    def tearDown(self):
+        get_client().flushdb()
+
+    def test_save_and_load(self):
+        """Saves a session and checks that it's loaded by its key."""
+        session = SessionStore()
+        session['user'] = 1
+        session.save()
+        self.assertTrue(session.exists(session.session_key))
+        self.assertEqual(SessionStore(session.session_key)['user'], 1)
+        session.delete()
+        self.assertFalse(session.exists(session.session_key))
+
+    def test_unknown_key_gets_new_session(self):
+        """Loads a session by a key that doesn't exist and checks that it's empty under a new key."""
+        session = SessionStore('unknown')
+        self.assertEqual(session.items(), [])
+        self.assertNotEqual(session.session_key, 'unknown')
@@ -1,32 +1,237 @@
+from datetime import datetime
+
 from django.conf import settings
+from django.conf.urls import patterns, url
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 
-import redis
 from restless.dj import DjangoResource
+from restless.exceptions import BadRequest
 from restless.preparers import FieldsPreparer
 
+from .backends import get_backend
 from .models import Task
 
 class TaskResource(DjangoResource):
+    http_methods = dict(DjangoResource.http_methods, batch={
+        'POST': 'batch',
+    }, search={
+        'GET': 'search',
+    }, streaks={
+        'GET': 'streaks',
+    }, changes={
+        'GET': 'changes',
+    })
+
     preparer = FieldsPreparer(fields={
         'id': 'id',
         'title': 'title',
         'repeatable': 'is_repeatable'
     })
 
+    def __init__(self, *args, **kwargs):
+        super(TaskResource, self).__init__(*args, **kwargs)
+        # Sets of current and done task ids, fetched once per list request.
+        self.current_task_ids = None
+        self.done_task_ids = None
+        # Id to pass as 'after' (or offset for search results) for the next page of a list, if there is one.
+        self.next_cursor = None
+        # Version of the user's tasks the response reflects, and further list metadata.
+        self.version = None
+        self.meta = {}
+
     def prepare(self, data):
         prepped = super(TaskResource, self).prepare(data)
-        # Check 'current' and 'done' by querying Redis.
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        prepped['current'] = redis_client.sismember('todo:current', prepped['id'])
-        prepped['done'] = redis_client.sismember('todo:done', prepped['id'])
+        task_id = str(prepped['id'])
+        if self.current_task_ids is not None:
+            # Check 'current' and 'done' against the state fetched for the whole list.
+            prepped['current'] = task_id in self.current_task_ids
+            prepped['done'] = task_id in self.done_task_ids
+        else:
+            # Check 'current' and 'done' for a single task.
+            prepped['current'], done_time = get_backend().task_state(data.user_id, task_id)
+            prepped['done'] = done_time is not None
+        # Archived reminders stay done and never come back for later, so clients need this to sort tasks into lists.
+        prepped['archived'] = data.is_archived()
         return prepped
 
+    @classmethod
+    def bootstrap(cls, request, tasks):
+        """Returns the JSON a list request would respond with for the given \
+        tasks, for pages to embed instead of requesting it separately."""
+        resource = cls()
+        resource.request = request
+        resource.version = get_backend().version(request.user.pk)
+        resource.current_task_ids, resource.done_task_ids = Task.objects.state_task_ids([request.user.pk])
+        return resource.serialize_list(list(tasks))
+
     def is_authenticated(self):
-        return True
-        # return self.request.user.is_authenticated()
+        return self.request.user.is_authenticated()
+
+    def handle(self, endpoint, *args, **kwargs):
+        """Answers conditional GETs from the user's state version.
+
+        Responses carry an ETag built from the version of the requesting \
+        user's tasks. A request whose If-None-Match matches the current \
+        version gets a 304 without the tasks being loaded.
+
+        Streaks change at local midnight without a change to the version, \
+        so they aren't answered conditionally.
+
+        """
+        if self.request_method() != 'GET' or endpoint == 'streaks' or not self.is_authenticated():
+            return super(TaskResource, self).handle(endpoint, *args, **kwargs)
+        user_id = self.request.user.pk
+        self.version = get_backend().version(user_id)
+        # parse_etags unquotes the tags it returns, so compare them against the unquoted tag.
+        etag = '{user_id}-{version}'.format(user_id=user_id, version=self.version)
+        if etag in parse_etags(self.request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = super(TaskResource, self).handle(endpoint, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = quote_etag(etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @classmethod
+    def urls(cls, name_prefix=None):
+        return patterns('',
+            url(r'^batch/$', cls.as_view('batch'), name=cls.build_url_name('batch', name_prefix)),
+            url(r'^search/$', cls.as_view('search'), name=cls.build_url_name('search', name_prefix)),
+            url(r'^changes/$', cls.as_view('changes'), name=cls.build_url_name('changes', name_prefix)),
+            url(r'^(?P<pk>\d+)/streaks/$', cls.as_view('streaks'), name=cls.build_url_name('streaks', name_prefix)),
+        ) + super(TaskResource, cls).urls(name_prefix=name_prefix)
+
+    def serialize(self, method, endpoint, data):
+        if endpoint in ('batch', 'search', 'changes'):
+            return self.serialize_list(data)
+        if endpoint == 'streaks':
+            return self.serializer.serialize(data)
+        return super(TaskResource, self).serialize(method, endpoint, data)
+
+    def wrap_list_response(self, data):
+        response = super(TaskResource, self).wrap_list_response(data)
+        response['meta'] = dict(self.meta, next=self.next_cursor, version=self.version)
+        return response
+
+    def get_limit(self):
+        """Returns the page size requested for a list, capped at ``TASK_MAX_PAGE_SIZE``."""
+        try:
+            limit = int(self.request.GET.get('limit', settings.TASK_PAGE_SIZE))
+        except ValueError:
+            raise BadRequest("'limit' must be an integer.")
+        if limit < 1:
+            raise BadRequest("'limit' must be positive.")
+        return min(limit, settings.TASK_MAX_PAGE_SIZE)
+
+    def get_page_params(self):
+        """Returns the cursor and page size requested for a list.
+
+        Tasks are paged by id: ``after`` is the id of the last task on the \
+        previous page and ``limit`` the number of tasks per page, capped \
+        at ``TASK_MAX_PAGE_SIZE``.
+
+        """
+        try:
+            after = int(self.request.GET.get('after', 0))
+        except ValueError:
+            raise BadRequest("'after' must be an integer.")
+        return after, self.get_limit()
 
     def list(self):
-        return Task.objects.all()
+        after, limit = self.get_page_params()
+        # Fetch one extra task to tell whether there's another page.
+        tasks = list(Task.objects.with_history(Task.objects.filter(user=self.request.user, pk__gt=after)).order_by('pk')[:limit + 1])
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            self.next_cursor = tasks[-1].pk
+        self.current_task_ids, self.done_task_ids = Task.objects.state_task_ids([self.request.user.pk])
+        return tasks
+
+    def search(self):
+        """Returns the user's tasks matching the query in 'q', best match first.
+
+        Results are paged by position: ``offset`` is the number of results \
+        to skip and ``limit`` the number of results per page, capped at \
+        ``TASK_MAX_PAGE_SIZE``.
+
+        """
+        query = self.request.GET.get('q', '').strip()
+        if not query:
+            raise BadRequest("'q' is required.")
+        try:
+            offset = int(self.request.GET.get('offset', 0))
+        except ValueError:
+            raise BadRequest("'offset' must be an integer.")
+        if offset < 0:
+            raise BadRequest("'offset' must not be negative.")
+        limit = self.get_limit()
+        # Fetch one extra task to tell whether there's another page.
+        tasks = list(Task.objects.with_history(Task.objects.search(self.request.user.pk, query))[offset:offset + limit + 1])
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            self.next_cursor = offset + limit
+        self.current_task_ids, self.done_task_ids = Task.objects.state_task_ids([self.request.user.pk])
+        return tasks
+
+    def changes(self):
+        """Returns the user's tasks changed since the version in 'since'.
+
+        Clients keep the version from the 'meta' of a list and ask for the \
+        changes since then instead of fetching the list again. The response \
+        lists the changed tasks, the ids of tasks deleted since then under \
+        'deleted' and the version to ask from next time. If the change log \
+        no longer covers 'since', 'reset' is true and no tasks are listed, \
+        and the client needs to fetch the list again.
+
+        """
+        try:
+            since = int(self.request.GET['since'])
+        except (KeyError, ValueError):
+            raise BadRequest("'since' must be an integer.")
+        user_id = self.request.user.pk
+        self.version, task_ids = get_backend().changes(user_id, since)
+        if task_ids is None:
+            self.meta = {'deleted': [], 'reset': True}
+            return []
+        tasks = list(Task.objects.with_history(Task.objects.filter(user_id=user_id, pk__in=task_ids)).order_by('pk'))
+        deleted_task_ids = set(int(task_id) for task_id in task_ids) - set(task.pk for task in tasks)
+        self.meta = {'deleted': sorted(deleted_task_ids), 'reset': False}
+        self.current_task_ids, self.done_task_ids = Task.objects.state_task_ids([user_id])
+        return tasks
 
     def detail(self, pk):
-        return Task.objects.get(id=pk)
+        return Task.objects.with_history(Task.objects.filter(user=self.request.user)).get(id=pk)
+
+    def batch(self):
+        """Marks many tasks as current or done in one request.
+
+        Expects a list of changes under 'objects', each with a task 'id' and \
+        optional 'current' and 'done' flags, and responds with the changed tasks.
+
+        """
+        changes = self.data.get('objects') if isinstance(self.data, dict) else None
+        if not isinstance(changes, list):
+            raise BadRequest("Expected a list of changes under 'objects'.")
+        try:
+            tasks = Task.objects.set_states(self.request.user.pk, changes)
+        except (KeyError, TypeError, ValueError):
+            raise BadRequest("Each change needs an integer 'id'.")
+        self.current_task_ids, self.done_task_ids = Task.objects.state_task_ids([self.request.user.pk])
+        return tasks
+
+    def streaks(self, pk):
+        """Returns the task's current and longest streaks and the days it was \
+        done in the month given as YYYY-MM in 'month', or this month."""
+        task = Task.objects.get(id=pk, user=self.request.user)
+        month = self.request.GET.get('month')
+        if month is None:
+            return task.completion()
+        try:
+            month = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            raise BadRequest("'month' must be formatted as YYYY-MM.")
+        return task.completion(month.year, month.month)
@@ -0,0 +1,130 @@
+"""Bundles static assets into minified files with content-hashed names.
+
+``ASSET_BUNDLES`` maps each bundle's name to the static files it's made \
+of, in order. ``build_assets`` writes each bundle to ``ASSET_BUILD_DIR`` \
+under a name containing a hash of its contents and records the names in \
+a manifest. Templates include bundles with the ``assets`` tag, which uses \
+the built files when there's a manifest and the source files otherwise.
+
+Hashed files never change, so they're served with far-future cache \
+headers by ``FarFutureCacheMiddleware``.
+
+"""
+import hashlib
+import json
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:
+    rcssmin = rjsmin = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Matches file names produced by build_bundle, like js/site.0123456789ab.js.
+HASHED_NAME_PATTERN = re.compile(r'\.[0-9a-f]{12}\.(?:css|js)$')
+
+_manifest = None
+
+def minify(name, content):
+    """Returns the minified content of the given static file.
+
+    Files that are already minified, and all files when rjsmin and rcssmin \
+    aren't installed, are returned as they are.
+
+    """
+    if rjsmin is None or '.min.' in name:
+        return content
+    if name.endswith('.js'):
+        return rjsmin.jsmin(content)
+    if name.endswith('.css'):
+        return rcssmin.cssmin(content)
+    return content
+
+def build_bundle(bundle_name, source_names, build_dir):
+    """Concatenates and minifies the given static files and writes them to \
+    the build directory under a content-hashed version of the bundle's name.
+
+    Returns the hashed name relative to the build directory's parent, \
+    which is where static files are found.
+
+    """
+    contents = []
+    for source_name in source_names:
+        path = finders.find(source_name)
+        if path is None:
+            raise ValueError("Static file {name} not found.".format(name=source_name))
+        with open(path) as source:
+            contents.append(minify(source_name, source.read()))
+    # Separate scripts so that one missing a trailing semicolon doesn't run into the next.
+    content = (';\n' if bundle_name.endswith('.js') else '\n').join(contents)
+    root, extension = os.path.splitext(bundle_name)
+    hashed_name = '{root}.{hash}{extension}'.format(
+        root=root, hash=hashlib.md5(content).hexdigest()[:12], extension=extension
+    )
+    path = os.path.join(build_dir, hashed_name)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as bundle:
+        bundle.write(content)
+    return '/'.join([os.path.basename(build_dir), hashed_name])
+
+def build(build_dir=None):
+    """Builds every bundle in ``ASSET_BUNDLES`` and writes the manifest.
+
+    Returns the manifest, a dictionary of bundle names to hashed names.
+
+    """
+    build_dir = build_dir or settings.ASSET_BUILD_DIR
+    manifest = dict(
+        (bundle_name, build_bundle(bundle_name, source_names, build_dir))
+        for bundle_name, source_names in settings.ASSET_BUNDLES.items()
+    )
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+    reset_manifest()
+    return manifest
+
+def get_manifest():
+    """Returns the manifest written by the last build, or None if assets haven't been built."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(settings.ASSET_BUILD_DIR, MANIFEST_NAME)) as manifest_file:
+                _manifest = json.load(manifest_file)
+        except IOError:
+            _manifest = {}
+    return _manifest or None
+
+def reset_manifest():
+    global _manifest
+    _manifest = None
+
+def bundle_files(bundle_name):
+    """Returns the list of static files to include for the given bundle: the \
+    built bundle if there is one and its source files otherwise."""
+    manifest = get_manifest()
+    if manifest is not None and bundle_name in manifest:
+        return [manifest[bundle_name]]
+    return list(settings.ASSET_BUNDLES[bundle_name])
+
+class FarFutureCacheMiddleware(object):
+    """WSGI middleware that lets clients cache content-hashed static files for a year."""
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(settings.STATIC_URL) or not HASHED_NAME_PATTERN.search(path):
+            return self.application(environ, start_response)
+
+        def cached_start_response(status, headers, exc_info=None):
+            headers = [(name, value) for name, value in headers if name.lower() not in ('cache-control', 'expires')]
+            headers.append(('Cache-Control', 'public, max-age=31536000'))
+            return start_response(status, headers, exc_info)
+        return self.application(environ, cached_start_response)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test.signals import setting_changed
+from django.utils.importlib import import_module
+
+from todo.redis_client import command_stats
+
+_backend = None
+
+def get_backend():
+    """Returns the task state backend named by the ``TASK_STATE_BACKEND`` setting.
+
+    The backend is created on first use and shared by the whole process.
+
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'TASK_STATE_BACKEND', 'tasks.backends.redis_backend.RedisBackend')
+        module_path, class_name = backend_path.rsplit('.', 1)
+        try:
+            backend_class = getattr(import_module(module_path), class_name)
+        except (ImportError, AttributeError) as e:
+            raise ImproperlyConfigured("Error loading task state backend {path}: {error}".format(path=backend_path, error=e))
+        _backend = backend_class()
+    return _backend
+
+def reset_backend(**kwargs):
+    """Discards the shared backend when the settings it's built from change."""
+    global _backend
+    if kwargs['setting'] in ('TASK_STATE_BACKEND', 'REDIS_POOL'):
+        _backend = None
+
+setting_changed.connect(reset_backend)
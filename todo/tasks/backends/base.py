@@ -0,0 +1,196 @@
+class BaseBackend(object):
+    """Interface for storing task state that changes from day to day.
+
+    A task can be current (in progress) and done today. Done tasks are kept \
+    with their done time in milliseconds since the epoch until they're \
+    archived to the main database. Task ids are returned as strings.
+
+    Each user also has a version that's bumped by every change to their \
+    tasks, and users with done tasks are kept in a schedule of when their \
+    tasks are due for archival.
+
+    Every change also records the changed task ids in the user's change \
+    log with the version it bumped to, so clients can ask for the tasks \
+    changed since a version they've seen. The log keeps the latest \
+    ``TASK_CHANGE_LOG_SIZE`` changed tasks; older entries are trimmed.
+    The new version is also published to the user's subscribers.
+
+    """
+    def current_task_ids(self, user_id):
+        """Returns set of task ids for the given user's current tasks."""
+        raise NotImplementedError
+
+    def done_task_ids(self, user_id):
+        """Returns set of task ids for the given user's done tasks."""
+        raise NotImplementedError
+
+    def state_task_ids(self, user_ids):
+        """Returns a tuple of the sets of current and done task ids for the given users."""
+        raise NotImplementedError
+
+    def recently_done_task_ids(self, user_id, limit):
+        """Returns a list of up to ``limit`` of the given user's done task ids, newest first."""
+        raise NotImplementedError
+
+    def task_state(self, user_id, task_id):
+        """Returns a tuple of whether the task is current and its done time, or None if not done."""
+        raise NotImplementedError
+
+    def is_current(self, user_id, task_id):
+        """Returns True if the task is current."""
+        raise NotImplementedError
+
+    def done_time(self, user_id, task_id):
+        """Returns the task's done time, or None if the task is not done."""
+        raise NotImplementedError
+
+    def set_current(self, user_id, task_id, current):
+        """Marks the task as current or not current and bumps the user's version."""
+        raise NotImplementedError
+
+    def set_done(self, user_id, task_id, done_time):
+        """Marks the task as done at the given time and bumps the user's version.
+
+        Tasks marked done are also marked current. A done time of None \
+        marks the task as not done.
+
+        """
+        raise NotImplementedError
+
+    def set_states(self, user_id, states, done_time):
+        """Marks many tasks as current or done at once and bumps the user's version.
+
+        ``states`` maps task ids to tuples of current and done flags, either \
+        of which may be None to leave it unchanged. Tasks marked done are \
+        marked done at the given time and also marked current.
+
+        """
+        raise NotImplementedError
+
+    def done_times(self, user_id):
+        """Returns a dictionary of the given user's done task ids to their done times."""
+        raise NotImplementedError
+
+    def restore_states(self, user_id, states):
+        """Marks many tasks as current or done at their own done times and \
+        bumps the user's version once.
+
+        ``states`` maps task ids to tuples of whether the task is current \
+        and its done time, or None if it's not done. Meant for restoring \
+        exported state; tasks aren't unmarked.
+
+        """
+        raise NotImplementedError
+
+    def version(self, user_id):
+        """Returns the version of the given user's task state."""
+        raise NotImplementedError
+
+    def record_changes(self, user_id, task_ids):
+        """Bumps the version of the given user's tasks and records the given \
+        tasks in the change log, for changes made outside the task state \
+        such as edits and deletions."""
+        raise NotImplementedError
+
+    def changes(self, user_id, since):
+        """Returns a tuple of the given user's version and the set of ids of \
+        tasks changed after version ``since``.
+
+        The set is None if the change log no longer covers ``since``, \
+        because older entries were trimmed or ``since`` is ahead of the \
+        version, in which case clients need to reload every task.
+
+        """
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """Returns a subscription to the versions the given user's changes bump to.
+
+        The subscription's ``get`` waits up to ``TASK_EVENTS_HEARTBEAT`` \
+        seconds for the next change and returns its version, or None if \
+        there was none. Changes can be missed around a None, so listeners \
+        check the version then. ``close`` ends the subscription.
+
+        """
+        raise NotImplementedError
+
+    def snapshot_done(self, user_id, before=None):
+        """Atomically takes the given user's done tasks out of the current and done state.
+
+        Only tasks done before ``before``, in milliseconds since the epoch, \
+        are taken if it's given; the rest stay current and done.
+
+        The snapshot is staged until ``finish_archival`` is called. If a staged \
+        snapshot is left over from an archival that didn't finish, the new \
+        done tasks are added to it.
+
+        Returns a tuple of whether a staged snapshot was left over and a \
+        dictionary of staged task ids to done times.
+
+        """
+        raise NotImplementedError
+
+    def finish_archival(self, user_id, task_ids, resumed, count, duration):
+        """Discards the given user's staged snapshot, records the archived \
+        tasks as changed and records the archival in the archival stats."""
+        raise NotImplementedError
+
+    def archival_stats(self):
+        """Returns a dictionary of archival counters.
+
+        'runs' and 'tasks' count completed archivals and the history entries \
+        they wrote, 'resumed' counts runs that picked up a snapshot left \
+        behind by a failed run, and 'duration' is the total time in seconds \
+        spent archiving, with 'last_duration' for the latest run.
+
+        """
+        raise NotImplementedError
+
+    def needs_archival(self, user_id):
+        """Returns True if the given user has done tasks and no archival scheduled."""
+        raise NotImplementedError
+
+    def schedule_archival(self, user_id, timestamp):
+        """Schedules archival for the given user at the given epoch time in seconds."""
+        raise NotImplementedError
+
+    def due_archivals(self, timestamp, limit):
+        """Returns a list of up to ``limit`` user ids whose archival is due by the given epoch time."""
+        raise NotImplementedError
+
+    def claim_archival(self, user_id):
+        """Removes the given user from the archival schedule.
+
+        Returns True if the user was scheduled, so only one caller claims it.
+
+        """
+        raise NotImplementedError
+
+    def set_done_days(self, task_days):
+        """Records the local days tasks were done in their completion bitmaps \
+        and updates their longest streaks.
+
+        ``task_days`` maps task ids to lists of day numbers (see \
+        ``tasks.helpers.day_number``). Recording a day twice is harmless. \
+        Days before day 0 are outside the bitmaps and skipped.
+
+        """
+        raise NotImplementedError
+
+    def done_days(self, task_id, first_day, last_day):
+        """Returns the set of day numbers from ``first_day`` to ``last_day`` \
+        (inclusive) the task was done on."""
+        raise NotImplementedError
+
+    def longest_streak(self, task_id):
+        """Returns the longest run of consecutive days in the task's \
+        completion bitmap, without reading the whole bitmap."""
+        raise NotImplementedError
+
+    def clear_done_days(self, task_ids):
+        """Removes the completion bitmaps of the given tasks."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Removes all state. Intended for tests."""
+        raise NotImplementedError
@@ -0,0 +1,235 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import count
+import Queue
+import threading
+import time
+
+from django.conf import settings
+
+from todo.redis_client import command_stats
+
+from .base import BaseBackend
+
+class MemorySubscription(object):
+    """Subscription to a user's versions through an in-process queue."""
+    def __init__(self, backend, user_id):
+        self.backend = backend
+        self.user_id = user_id
+        self.queue = Queue.Queue()
+
+    def get(self):
+        try:
+            return self.queue.get(timeout=settings.TASK_EVENTS_HEARTBEAT)
+        except Queue.Empty:
+            return None
+
+    def close(self):
+        with self.backend.lock:
+            if self in self.backend.subscriptions[self.user_id]:
+                self.backend.subscriptions[self.user_id].remove(self)
+
+class MemoryBackend(BaseBackend):
+    """Keeps task state in the memory of the current process.
+
+    State is shared by all threads in the process and lost when it exits, \
+    so this suits single-process deploys and tests.
+
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.flush()
+
+    @contextmanager
+    def command(self):
+        """Holds the lock for one command, counted as a single command in ``command_stats``."""
+        start_time = time.time()
+        with self.lock:
+            yield
+        command_stats.record(1, time.time() - start_time)
+
+    def current_task_ids(self, user_id):
+        with self.command():
+            return set(self.current[user_id])
+
+    def done_task_ids(self, user_id):
+        with self.command():
+            return set(self.done[user_id])
+
+    def state_task_ids(self, user_ids):
+        current_tasks, done_tasks = set(), set()
+        with self.command():
+            for user_id in user_ids:
+                current_tasks.update(self.current[user_id])
+                done_tasks.update(self.done[user_id])
+        return current_tasks, done_tasks
+
+    def recently_done_task_ids(self, user_id, limit):
+        with self.command():
+            done_tasks = sorted(self.done[user_id].items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return [task_id for task_id, done_time in done_tasks[:limit]]
+
+    def task_state(self, user_id, task_id):
+        task_id = str(task_id)
+        with self.command():
+            return task_id in self.current[user_id], self.done[user_id].get(task_id)
+
+    def is_current(self, user_id, task_id):
+        with self.command():
+            return str(task_id) in self.current[user_id]
+
+    def done_time(self, user_id, task_id):
+        with self.command():
+            return self.done[user_id].get(str(task_id))
+
+    def set_current(self, user_id, task_id, current):
+        self.set_states(user_id, {task_id: (current, None)}, None)
+
+    def set_done(self, user_id, task_id, done_time):
+        self.set_states(user_id, {task_id: (None, done_time is not None)}, done_time)
+
+    def set_states(self, user_id, states, done_time):
+        with self.command():
+            for task_id, (current, done) in states.iteritems():
+                task_id = str(task_id)
+                if current or done:
+                    self.current[user_id].add(task_id)
+                elif current is not None:
+                    self.current[user_id].discard(task_id)
+                if done:
+                    self.done[user_id][task_id] = int(done_time)
+                elif done is not None:
+                    self.done[user_id].pop(task_id, None)
+            self.log_changes(user_id, states.keys())
+
+    def done_times(self, user_id):
+        with self.command():
+            return dict(self.done[user_id])
+
+    def restore_states(self, user_id, states):
+        with self.command():
+            for task_id, (current, done_time) in states.iteritems():
+                task_id = str(task_id)
+                if current or done_time is not None:
+                    self.current[user_id].add(task_id)
+                if done_time is not None:
+                    self.done[user_id][task_id] = int(done_time)
+            self.log_changes(user_id, states.keys())
+
+    def version(self, user_id):
+        with self.command():
+            return self.versions[user_id]
+
+    def log_changes(self, user_id, task_ids):
+        """Bumps the user's version, records the tasks in the change log, \
+        trimming the oldest entries past ``TASK_CHANGE_LOG_SIZE``, and passes \
+        the new version to the user's subscriptions. Expects the lock to be \
+        held."""
+        self.versions[user_id] += 1
+        changes = self.change_log[user_id]
+        for task_id in task_ids:
+            changes[str(task_id)] = self.versions[user_id]
+        excess = len(changes) - settings.TASK_CHANGE_LOG_SIZE
+        if excess > 0:
+            trimmed = sorted(changes.items(), key=lambda item: (item[1], item[0]))[:excess]
+            for task_id, version in trimmed:
+                del changes[task_id]
+            self.trimmed_versions[user_id] = trimmed[-1][1]
+        for subscription in self.subscriptions[user_id]:
+            subscription.queue.put(self.versions[user_id])
+
+    def record_changes(self, user_id, task_ids):
+        with self.command():
+            self.log_changes(user_id, task_ids)
+
+    def changes(self, user_id, since):
+        with self.command():
+            version = self.versions[user_id]
+            if since < self.trimmed_versions[user_id] or since > version:
+                return version, None
+            return version, set(task_id for task_id, changed in self.change_log[user_id].iteritems() if changed > since)
+
+    def subscribe(self, user_id):
+        subscription = MemorySubscription(self, user_id)
+        with self.lock:
+            self.subscriptions[user_id].append(subscription)
+        return subscription
+
+    def snapshot_done(self, user_id, before=None):
+        with self.command():
+            resumed = bool(self.archiving[user_id])
+            done_tasks = dict((task_id, done_time) for task_id, done_time in self.done[user_id].iteritems()
+                              if before is None or done_time < before)
+            for task_id, done_time in done_tasks.iteritems():
+                del self.done[user_id][task_id]
+                self.archiving[user_id][task_id] = done_time
+                self.current[user_id].discard(task_id)
+            self.log_changes(user_id, done_tasks.keys())
+            return resumed, dict(self.archiving[user_id])
+
+    def finish_archival(self, user_id, task_ids, resumed, count, duration):
+        with self.command():
+            self.archiving.pop(user_id, None)
+            self.log_changes(user_id, task_ids)
+            self.stats['runs'] += 1
+            self.stats['resumed'] += 1 if resumed else 0
+            self.stats['tasks'] += count
+            self.stats['duration'] += duration
+            self.stats['last_duration'] = duration
+
+    def archival_stats(self):
+        with self.command():
+            return dict(self.stats)
+
+    def needs_archival(self, user_id):
+        with self.command():
+            return user_id not in self.schedule and bool(self.done[user_id])
+
+    def schedule_archival(self, user_id, timestamp):
+        with self.command():
+            self.schedule[user_id] = timestamp
+
+    def due_archivals(self, timestamp, limit):
+        with self.command():
+            due = sorted((due_time, user_id) for user_id, due_time in self.schedule.items() if due_time <= timestamp)
+        return [user_id for due_time, user_id in due[:limit]]
+
+    def claim_archival(self, user_id):
+        with self.command():
+            return self.schedule.pop(user_id, None) is not None
+
+    def set_done_days(self, task_days):
+        with self.command():
+            for task_id, days in task_days.iteritems():
+                self.days[str(task_id)].update(day for day in days if day >= 0)
+
+    def done_days(self, task_id, first_day, last_day):
+        with self.command():
+            return set(day for day in self.days[str(task_id)] if first_day <= day <= last_day)
+
+    def longest_streak(self, task_id):
+        with self.command():
+            days = self.days[str(task_id)]
+            # Count each run from its first day.
+            return max([0] + [
+                next(length for length in count(1) if day + length not in days)
+                for day in days if day - 1 not in days
+            ])
+
+    def clear_done_days(self, task_ids):
+        with self.command():
+            for task_id in task_ids:
+                self.days.pop(str(task_id), None)
+
+    def flush(self):
+        with self.command():
+            self.current = defaultdict(set)
+            self.done = defaultdict(dict)
+            self.archiving = defaultdict(dict)
+            self.versions = defaultdict(int)
+            self.change_log = defaultdict(dict)
+            self.trimmed_versions = defaultdict(int)
+            self.subscriptions = defaultdict(list)
+            self.schedule = {}
+            self.days = defaultdict(set)
+            self.stats = {'runs': 0, 'resumed': 0, 'tasks': 0, 'duration': 0.0, 'last_duration': 0.0}
@@ -0,0 +1,429 @@
+from django.conf import settings
+
+import redis
+
+from todo.redis_client import get_client
+
+from .base import BaseBackend
+
+# Redis hash of counters describing archival runs across all users.
+ARCHIVAL_STATS_KEY = 'stats:archival'
+
+# Redis sorted set of user ids scored by when their done tasks are due for archival.
+ARCHIVAL_SCHEDULE_KEY = 'archival:schedule'
+
+# Defines record_changes for scripts that change task state, which bumps \
+# the user's version, scores each changed task id by the new version in \
+# the change log and trims the oldest entries past the limit, keeping the \
+# highest trimmed version. The new version is published on the user's \
+# events channel and returned.
+RECORD_CHANGES_FUNCTION = """
+local function record_changes(version_key, changes_key, trimmed_key, limit, channel, task_ids)
+    local version = redis.call('incr', version_key)
+    for i = 1, #task_ids do
+        redis.call('zadd', changes_key, version, task_ids[i])
+    end
+    local excess = redis.call('zcard', changes_key) - limit
+    if excess > 0 then
+        local trimmed = redis.call('zrange', changes_key, excess - 1, excess - 1, 'withscores')
+        redis.call('set', trimmed_key, trimmed[2])
+        redis.call('zremrangebyrank', changes_key, 0, excess - 1)
+    end
+    redis.call('publish', channel, version)
+    return version
+end
+"""
+
+RECORD_CHANGES_SCRIPT = RECORD_CHANGES_FUNCTION + """
+local task_ids = {}
+for i = 3, #ARGV do
+    task_ids[#task_ids + 1] = ARGV[i]
+end
+return record_changes(KEYS[1], KEYS[2], KEYS[3], tonumber(ARGV[1]), ARGV[2], task_ids)
+"""
+
+# Atomically moves the done time of every task done by the maximum score \
+# in ARGV[3] into the staging hash, clears the task's current/done state \
+# and records the changes. Staging is kept until the history entries are \
+# written, so an archival that fails part way is picked up by the next \
+# run. Returns whether staging already existed and its contents.
+SNAPSHOT_SCRIPT = RECORD_CHANGES_FUNCTION + """
+local resumed = redis.call('exists', KEYS[3])
+local done_tasks = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[3], 'withscores')
+local task_ids = {}
+for i = 1, #done_tasks, 2 do
+    redis.call('hset', KEYS[3], done_tasks[i], done_tasks[i + 1])
+    redis.call('srem', KEYS[2], done_tasks[i])
+    task_ids[#task_ids + 1] = done_tasks[i]
+end
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[3])
+record_changes(KEYS[4], KEYS[5], KEYS[6], tonumber(ARGV[1]), ARGV[2], task_ids)
+return {resumed, redis.call('hgetall', KEYS[3])}
+"""
+
+# Defines longest_run for completion scripts, which scans a whole \
+# completion bitmap for its longest run of set bits. Bits run from the \
+# most significant bit of the first byte.
+LONGEST_RUN_FUNCTION = """
+local function longest_run(bitmap_key)
+    local bitmap = redis.call('get', bitmap_key) or ''
+    local longest, run = 0, 0
+    for i = 1, #bitmap do
+        local byte = string.byte(bitmap, i)
+        for shift = 7, 0, -1 do
+            if bit.band(byte, bit.lshift(1, shift)) ~= 0 then
+                run = run + 1
+                longest = math.max(longest, run)
+            else
+                run = 0
+            end
+        end
+    end
+    return longest
+end
+"""
+
+# Sets the given days in a task's completion bitmap and updates its \
+# longest streak from the runs through the new days. A longest streak \
+# that hasn't been stored yet is computed from the whole bitmap once.
+SET_DONE_DAYS_SCRIPT = LONGEST_RUN_FUNCTION + """
+local longest = redis.call('get', KEYS[2])
+for i = 1, #ARGV do
+    redis.call('setbit', KEYS[1], ARGV[i], 1)
+end
+if longest then
+    longest = tonumber(longest)
+    for i = 1, #ARGV do
+        local first, last = tonumber(ARGV[i]), tonumber(ARGV[i])
+        while first > 0 and redis.call('getbit', KEYS[1], first - 1) == 1 do
+            first = first - 1
+        end
+        while redis.call('getbit', KEYS[1], last + 1) == 1 do
+            last = last + 1
+        end
+        longest = math.max(longest, last - first + 1)
+    end
+else
+    longest = longest_run(KEYS[1])
+end
+redis.call('set', KEYS[2], longest)
+"""
+
+# Returns a task's longest streak, computing and storing it from the \
+# whole bitmap if it hasn't been stored yet.
+LONGEST_STREAK_SCRIPT = LONGEST_RUN_FUNCTION + """
+local longest = redis.call('get', KEYS[2])
+if longest then
+    return tonumber(longest)
+end
+longest = longest_run(KEYS[1])
+if longest > 0 then
+    redis.call('set', KEYS[2], longest)
+end
+return longest
+"""
+
+def current_key(user_id):
+    """Returns the Redis key for the set of the given user's current task ids."""
+    return 'user:{user_id}:current'.format(user_id=user_id)
+
+def done_key(user_id):
+    """Returns the Redis key for the sorted set of the given user's done task ids.
+
+    Each task id is scored by its done time in milliseconds since the epoch.
+
+    """
+    return 'user:{user_id}:done_times'.format(user_id=user_id)
+
+def version_key(user_id):
+    """Returns the Redis key for the counter of changes to the given user's tasks."""
+    return 'user:{user_id}:version'.format(user_id=user_id)
+
+def changes_key(user_id):
+    """Returns the Redis key for the sorted set of the given user's changed \
+    task ids, each scored by the version it last changed in."""
+    return 'user:{user_id}:changes'.format(user_id=user_id)
+
+def trimmed_version_key(user_id):
+    """Returns the Redis key for the highest version trimmed from the given user's change log."""
+    return 'user:{user_id}:changes_trimmed'.format(user_id=user_id)
+
+def events_channel(user_id):
+    """Returns the Redis channel the given user's new versions are published on."""
+    return 'user:{user_id}:events'.format(user_id=user_id)
+
+def archiving_key(user_id):
+    """Returns the Redis key for the hash of the given user's task done times \
+    (in milliseconds since the epoch) staged for archival."""
+    return 'user:{user_id}:archiving'.format(user_id=user_id)
+
+def done_days_key(task_id):
+    """Returns the Redis key for the bitmap of the local days the given task was done.
+
+    Bit n is set if the task was done on day number n.
+
+    """
+    return 'task:{task_id}:done_days'.format(task_id=task_id)
+
+def longest_streak_key(task_id):
+    """Returns the Redis key for the longest run of consecutive days in the \
+    given task's completion bitmap."""
+    return 'task:{task_id}:longest_streak'.format(task_id=task_id)
+
+class RedisSubscription(object):
+    """Subscription to a user's events channel.
+
+    Each subscription holds its own connection from a pool whose socket \
+    timeout is ``TASK_EVENTS_HEARTBEAT``. A read that times out drops the \
+    connection, which is subscribed again on the next read; versions \
+    published in between are missed, so listeners check the version \
+    whenever ``get`` returns None.
+
+    """
+    def __init__(self, connection_pool, channel):
+        self.pubsub = redis.StrictRedis(connection_pool=connection_pool).pubsub()
+        self.channel = channel
+        self.pubsub.subscribe(channel)
+
+    def get(self):
+        if self.pubsub.connection is None:
+            self.pubsub.subscribe(self.channel)
+        try:
+            for message in self.pubsub.listen():
+                if message['type'] == 'message':
+                    return int(message['data'])
+        except redis.ConnectionError:
+            self.pubsub.reset()
+        return None
+
+    def close(self):
+        self.pubsub.close()
+
+class RedisBackend(BaseBackend):
+    """Keeps task state in Redis, using the connection pool in ``REDIS_POOL``.
+
+    Subscriptions to events hold a connection each for as long as they're \
+    open, so they use a separate pool to the same server, capped at \
+    ``TASK_EVENTS_MAX_CONNECTIONS``.
+
+    """
+    def __init__(self):
+        self.client = get_client()
+        # Registered scripts by their Lua source.
+        self.scripts = {}
+        connection_kwargs = dict(settings.REDIS_POOL.connection_kwargs, socket_timeout=settings.TASK_EVENTS_HEARTBEAT)
+        self.events_pool = redis.ConnectionPool(connection_class=settings.REDIS_POOL.connection_class,
+                                                max_connections=settings.TASK_EVENTS_MAX_CONNECTIONS,
+                                                **connection_kwargs)
+
+    def script(self, source):
+        """Returns the registered script for the given Lua source.
+
+        Registering loads the script into Redis, so each script is only \
+        registered the first time it's needed, not when the backend is created.
+
+        """
+        script = self.scripts.get(source)
+        if script is None:
+            script = self.scripts[source] = self.client.register_script(source)
+        return script
+
+    def change_keys(self, user_id):
+        return [version_key(user_id), changes_key(user_id), trimmed_version_key(user_id)]
+
+    def change_args(self, user_id, task_ids):
+        return [settings.TASK_CHANGE_LOG_SIZE, events_channel(user_id)] + list(task_ids)
+
+    def queue_changes(self, redis_pipeline, user_id, task_ids):
+        """Queues recording the changed tasks on the pipeline, which bumps the user's version."""
+        self.script(RECORD_CHANGES_SCRIPT)(keys=self.change_keys(user_id),
+                                           args=self.change_args(user_id, task_ids),
+                                           client=redis_pipeline)
+
+    def current_task_ids(self, user_id):
+        return self.client.smembers(current_key(user_id))
+
+    def done_task_ids(self, user_id):
+        return set(self.client.zrange(done_key(user_id), 0, -1))
+
+    def state_task_ids(self, user_ids):
+        redis_pipeline = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            redis_pipeline.smembers(current_key(user_id)) \
+                          .zrange(done_key(user_id), 0, -1)
+        current_tasks, done_tasks = set(), set()
+        results = redis_pipeline.execute()
+        for user_current_tasks, user_done_tasks in zip(results[::2], results[1::2]):
+            current_tasks.update(user_current_tasks)
+            done_tasks.update(user_done_tasks)
+        return current_tasks, done_tasks
+
+    def recently_done_task_ids(self, user_id, limit):
+        return self.client.zrevrange(done_key(user_id), 0, limit - 1)
+
+    def task_state(self, user_id, task_id):
+        is_current, done_time = self.client.pipeline(transaction=False) \
+                                           .sismember(current_key(user_id), task_id) \
+                                           .zscore(done_key(user_id), task_id) \
+                                           .execute()
+        return is_current, int(done_time) if done_time is not None else None
+
+    def is_current(self, user_id, task_id):
+        return self.client.sismember(current_key(user_id), task_id)
+
+    def done_time(self, user_id, task_id):
+        done_time = self.client.zscore(done_key(user_id), task_id)
+        return int(done_time) if done_time is not None else None
+
+    def set_current(self, user_id, task_id, current):
+        redis_pipeline = self.client.pipeline()
+        if current:
+            redis_pipeline.sadd(current_key(user_id), task_id)
+        else:
+            redis_pipeline.srem(current_key(user_id), task_id)
+        self.queue_changes(redis_pipeline, user_id, [task_id])
+        redis_pipeline.execute()
+
+    def set_done(self, user_id, task_id, done_time):
+        redis_pipeline = self.client.pipeline()
+        if done_time is not None:
+            redis_pipeline.sadd(current_key(user_id), task_id) \
+                          .zadd(done_key(user_id), done_time, task_id)
+        else:
+            redis_pipeline.zrem(done_key(user_id), task_id)
+        self.queue_changes(redis_pipeline, user_id, [task_id])
+        redis_pipeline.execute()
+
+    def set_states(self, user_id, states, done_time):
+        redis_pipeline = self.client.pipeline()
+        for task_id, (current, done) in states.iteritems():
+            if current or done:
+                redis_pipeline.sadd(current_key(user_id), task_id)
+            elif current is not None:
+                redis_pipeline.srem(current_key(user_id), task_id)
+            if done:
+                redis_pipeline.zadd(done_key(user_id), done_time, task_id)
+            elif done is not None:
+                redis_pipeline.zrem(done_key(user_id), task_id)
+        self.queue_changes(redis_pipeline, user_id, states.keys())
+        redis_pipeline.execute()
+
+    def done_times(self, user_id):
+        done_tasks = self.client.zrange(done_key(user_id), 0, -1, withscores=True)
+        return dict((task_id, int(done_time)) for task_id, done_time in done_tasks)
+
+    def restore_states(self, user_id, states):
+        redis_pipeline = self.client.pipeline()
+        for task_id, (current, done_time) in states.iteritems():
+            if current or done_time is not None:
+                redis_pipeline.sadd(current_key(user_id), task_id)
+            if done_time is not None:
+                redis_pipeline.zadd(done_key(user_id), done_time, task_id)
+        self.queue_changes(redis_pipeline, user_id, states.keys())
+        redis_pipeline.execute()
+
+    def version(self, user_id):
+        return int(self.client.get(version_key(user_id)) or 0)
+
+    def record_changes(self, user_id, task_ids):
+        self.script(RECORD_CHANGES_SCRIPT)(keys=self.change_keys(user_id),
+                                           args=self.change_args(user_id, task_ids))
+
+    def changes(self, user_id, since):
+        version, trimmed_version, task_ids = self.client.pipeline() \
+                                                        .get(version_key(user_id)) \
+                                                        .get(trimmed_version_key(user_id)) \
+                                                        .zrangebyscore(changes_key(user_id), '({since}'.format(since=since), '+inf') \
+                                                        .execute()
+        version = int(version or 0)
+        if since < int(trimmed_version or 0) or since > version:
+            return version, None
+        return version, set(task_ids)
+
+    def subscribe(self, user_id):
+        return RedisSubscription(self.events_pool, events_channel(user_id))
+
+    def snapshot_done(self, user_id, before=None):
+        max_done_time = '({before}'.format(before=before) if before is not None else '+inf'
+        resumed, staged = self.script(SNAPSHOT_SCRIPT)(
+            keys=[done_key(user_id), current_key(user_id), archiving_key(user_id)] + self.change_keys(user_id),
+            args=self.change_args(user_id, []) + [max_done_time]
+        )
+        return bool(resumed), dict((task_id, int(float(done_time))) for task_id, done_time in zip(staged[::2], staged[1::2]))
+
+    def finish_archival(self, user_id, task_ids, resumed, count, duration):
+        redis_pipeline = self.client.pipeline().delete(archiving_key(user_id))
+        self.queue_changes(redis_pipeline, user_id, task_ids)
+        redis_pipeline.hincrby(ARCHIVAL_STATS_KEY, 'runs', 1) \
+                      .hincrby(ARCHIVAL_STATS_KEY, 'resumed', 1 if resumed else 0) \
+                      .hincrby(ARCHIVAL_STATS_KEY, 'tasks', count) \
+                      .hincrbyfloat(ARCHIVAL_STATS_KEY, 'duration', duration) \
+                      .hset(ARCHIVAL_STATS_KEY, 'last_duration', duration) \
+                      .execute()
+
+    def archival_stats(self):
+        stats = self.client.hgetall(ARCHIVAL_STATS_KEY)
+        return {
+            'runs': int(stats.get('runs', 0)),
+            'resumed': int(stats.get('resumed', 0)),
+            'tasks': int(stats.get('tasks', 0)),
+            'duration': float(stats.get('duration', 0)),
+            'last_duration': float(stats.get('last_duration', 0)),
+        }
+
+    def needs_archival(self, user_id):
+        scheduled, has_done_tasks = self.client.pipeline(transaction=False) \
+                                               .zscore(ARCHIVAL_SCHEDULE_KEY, user_id) \
+                                               .exists(done_key(user_id)) \
+                                               .execute()
+        return scheduled is None and bool(has_done_tasks)
+
+    def schedule_archival(self, user_id, timestamp):
+        self.client.zadd(ARCHIVAL_SCHEDULE_KEY, timestamp, user_id)
+
+    def due_archivals(self, timestamp, limit):
+        user_ids = self.client.zrangebyscore(ARCHIVAL_SCHEDULE_KEY, '-inf', timestamp, start=0, num=limit)
+        return [int(user_id) for user_id in user_ids]
+
+    def claim_archival(self, user_id):
+        return bool(self.client.zrem(ARCHIVAL_SCHEDULE_KEY, user_id))
+
+    def set_done_days(self, task_days):
+        redis_pipeline = self.client.pipeline(transaction=False)
+        for task_id, days in task_days.iteritems():
+            # Bitmaps start at day 0, so earlier days can't be recorded.
+            days = [day for day in days if day >= 0]
+            if days:
+                self.script(SET_DONE_DAYS_SCRIPT)(keys=[done_days_key(task_id), longest_streak_key(task_id)],
+                                                  args=days,
+                                                  client=redis_pipeline)
+        redis_pipeline.execute()
+
+    def done_days(self, task_id, first_day, last_day):
+        first_day = max(first_day, 0)
+        if last_day < first_day:
+            return set()
+        # Fetch only the bytes covering the range. Bits run from the most \
+        # significant bit of the first byte.
+        first_byte = first_day // 8
+        bitmap = bytearray(self.client.getrange(done_days_key(task_id), first_byte, last_day // 8))
+        days = set()
+        for index, byte in enumerate(bitmap):
+            if not byte:
+                continue
+            for bit in xrange(8):
+                day = (first_byte + index) * 8 + bit
+                if byte & (0x80 >> bit) and first_day <= day <= last_day:
+                    days.add(day)
+        return days
+
+    def longest_streak(self, task_id):
+        return self.script(LONGEST_STREAK_SCRIPT)(keys=[done_days_key(task_id), longest_streak_key(task_id)])
+
+    def clear_done_days(self, task_ids):
+        if task_ids:
+            keys = [done_days_key(task_id) for task_id in task_ids] + [longest_streak_key(task_id) for task_id in task_ids]
+            self.client.delete(*keys)
+
+    def flush(self):
+        self.client.flushdb()
@@ -0,0 +1,37 @@
+"""Pushes the versions of a user's tasks to their open pages as Server-Sent Events.
+
+Every change to a user's tasks bumps their version and publishes it to \
+the backend's subscriptions. The stream sends the version when it opens, \
+after every change and, if nothing changes, every ``TASK_EVENTS_HEARTBEAT`` \
+seconds. Pages fetch the changes since the version they have from the \
+task changes API whenever a newer version arrives, so a missed event only \
+delays an update until the next one.
+
+Each open stream holds a worker connection and a Redis connection for as \
+long as the page is open, which suits the gevent workers. Redis \
+connections for streams are capped at ``TASK_EVENTS_MAX_CONNECTIONS`` per \
+process; streams opened past the cap fail, and browsers retry them.
+
+"""
+from .backends import get_backend
+
+# Milliseconds browsers wait before reconnecting a dropped stream.
+RETRY_INTERVAL = 5000
+
+def format_event(name, data):
+    return 'event: {name}\ndata: {data}\n\n'.format(name=name, data=data)
+
+def version_events(user_id):
+    """Yields the given user's versions as events until the stream is closed."""
+    backend = get_backend()
+    # Subscribe before reading the version, so no change falls in between.
+    subscription = backend.subscribe(user_id)
+    try:
+        yield 'retry: {interval}\n'.format(interval=RETRY_INTERVAL) + format_event('version', backend.version(user_id))
+        while True:
+            version = subscription.get()
+            if version is None:
+                version = backend.version(user_id)
+            yield format_event('version', version)
+    finally:
+        subscription.close()
@@ -1,22 +1,94 @@
-from datetime import datetime, time, timedelta
+import calendar
+from datetime import date, datetime, time, timedelta
+import random
 
 from django.conf import settings
 from django.utils import timezone
 
 import pytz
-import redis
 
-# from .tasks import archive_tasks
+from profiles.models import Profile
+
+from .backends import get_backend
+
+# The local day numbered 0 in task completion bitmaps. Earlier days have \
+# negative numbers and aren't recorded.
+DAY_ZERO = date(2013, 1, 1)
+
+# Days of a completion bitmap read at a time while looking for the start \
+# of a task's current streak.
+STREAK_WINDOW_DAYS = 64
+
+def epoch_milliseconds(utc_datetime):
+    """Returns the given UTC datetime in milliseconds since the epoch."""
+    return calendar.timegm(utc_datetime.utctimetuple()) * 1000 + utc_datetime.microsecond // 1000
+
+def from_epoch_milliseconds(milliseconds):
+    """Returns the UTC datetime for the given milliseconds since the epoch."""
+    return timezone.utc.localize(datetime.utcfromtimestamp(milliseconds / 1000.0))
+
+def day_number(local_date):
+    """Returns the number of the given local date in task completion bitmaps."""
+    return (local_date - DAY_ZERO).days
+
+def local_day_number(milliseconds, local_timezone):
+    """Returns the day number of the local date in the given timezone at the \
+    given milliseconds since the epoch."""
+    return day_number(from_epoch_milliseconds(milliseconds).astimezone(local_timezone).date())
+
+def trailing_streak(done_days, today):
+    """Returns a tuple of the current streak of consecutive days in the given \
+    set of day numbers and the number of the day before the streak.
+
+    The current streak ends today, or yesterday if the task isn't done yet \
+    today, since the streak isn't broken until today is over.
+
+    """
+    day = today if today in done_days else today - 1
+    streak = 0
+    while day in done_days:
+        streak += 1
+        day -= 1
+    return streak, day
+
+def user_timezone(user_id):
+    """Returns the timezone from the given user's profile.
+
+    Falls back to the site's timezone if the user has no profile or \
+    the profile's timezone is not recognized.
+
+    """
+    timezone_names = Profile.objects.filter(user_id=user_id).values_list('timezone', flat=True)
+    try:
+        return pytz.timezone(timezone_names[0])
+    except (IndexError, pytz.UnknownTimeZoneError):
+        return pytz.timezone(settings.TIME_ZONE)
+
+def last_midnight(local_timezone):
+    """Returns the latest midnight in the given timezone as a UTC datetime."""
+    utc_datetime = timezone.utc.localize(datetime.utcnow())
+    local_datetime = utc_datetime.astimezone(local_timezone)
+    local_midnight = local_timezone.localize(datetime.combine(local_datetime.date(), time()))
+    return local_midnight.astimezone(timezone.utc)
+
+def next_midnight(local_timezone):
+    """Returns the next midnight in the given timezone as a UTC datetime."""
+    utc_datetime = timezone.utc.localize(datetime.utcnow())
+    local_datetime = utc_datetime.astimezone(local_timezone)
+    local_midnight = local_timezone.localize(datetime.combine(local_datetime.date() + timedelta(days=1), time()))
+    return local_midnight.astimezone(timezone.utc)
 
 def schedule_archival(user_id):
-    """Schedules a job to archive done tasks at midnight in the given user's local time."""
-    user_key = 'user#{user_id}'.format(user_id=user_id)
-    redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-    if not redis_client.hexists(user_key, 'archive_task_id') and redis_client.exists('todo:done'):
-        utc_datetime = timezone.utc.localize(datetime.utcnow())
-        local_timezone = pytz.timezone('America/New_York')
-        local_datetime = utc_datetime.astimezone(local_timezone)
-        local_midnight = local_timezone.localize(datetime.combine(local_datetime.date() + timedelta(days=1), time()))
-        midnight = local_midnight.astimezone(timezone.utc)
-        celery_result = archive_tasks.apply_async(args=[user_id], eta=midnight)
-        redis_client.hset(user_key, 'archive_task_id', celery_result.id)
+    """Schedules archival of done tasks at midnight in the given user's local time.
+
+    Users are scheduled at the epoch time of their next local midnight, \
+    plus up to ``ARCHIVAL_JITTER`` seconds so archivals don't all land on \
+    the same second. The periodic sweeper archives users whose time has \
+    passed. Users already scheduled are left alone.
+
+    """
+    backend = get_backend()
+    if backend.needs_archival(user_id):
+        midnight = next_midnight(user_timezone(user_id))
+        jitter = random.uniform(0, getattr(settings, 'ARCHIVAL_JITTER', 0))
+        backend.schedule_archival(user_id, calendar.timegm(midnight.utctimetuple()) + jitter)
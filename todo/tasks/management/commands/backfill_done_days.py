@@ -0,0 +1,48 @@
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from tasks.backends import get_backend
+from tasks.helpers import day_number, user_timezone
+from tasks.models import History
+
+class Command(BaseCommand):
+    """Sets the completion bitmaps of repeatable tasks from their history.
+
+    Archival sets a bit for each day a repeatable task is done, so this \
+    only needs to run once for history archived before bitmaps existed. \
+    Setting a bit twice is harmless, so it's safe to run again.
+
+    """
+    help = "Fills in completion bitmaps from the history of repeatable tasks."
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=1000,
+            help="Number of history entries to read per query."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        timezones = {}
+        history = History.objects.filter(task__is_repeatable=True).order_by('pk') \
+                                 .values_list('pk', 'task_id', 'task__user_id', 'done_time')
+        last_pk = 0
+        count = 0
+        while True:
+            entries = list(history.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not entries:
+                break
+            task_days = defaultdict(list)
+            for pk, task_id, user_id, done_time in entries:
+                if user_id not in timezones:
+                    timezones[user_id] = user_timezone(user_id)
+                task_days[task_id].append(day_number(done_time.astimezone(timezones[user_id]).date()))
+            backend.set_done_days(task_days)
+            last_pk = entries[-1][0]
+            count += len(entries)
+        self.stdout.write("Set {count} days in completion bitmaps.".format(count=count))
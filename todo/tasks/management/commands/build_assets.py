@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from tasks.assets import build, rjsmin
+
+class Command(BaseCommand):
+    """Concatenates and minifies the bundles in ``ASSET_BUNDLES`` into \
+    content-hashed files in ``ASSET_BUILD_DIR``.
+
+    Run before ``collectstatic`` on deploy. Templates use the built files \
+    once the manifest exists.
+
+    """
+    help = "Builds minified, content-hashed static asset bundles."
+
+    def handle(self, *args, **options):
+        if rjsmin is None:
+            self.stderr.write("rjsmin and rcssmin aren't installed, so bundles won't be minified.")
+        for bundle_name, hashed_name in sorted(build().items()):
+            self.stdout.write("{bundle} -> {hashed}".format(bundle=bundle_name, hashed=hashed_name))
@@ -0,0 +1,46 @@
+from optparse import make_option
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.transfer import export_lines
+
+class Command(BaseCommand):
+    """Writes a user's tasks, history and task state as JSON Lines.
+
+    Rows are read in batches, so the export can be piped straight into \
+    ``import_tasks`` in another environment.
+
+    """
+    args = '<email>'
+    help = "Exports a user's tasks and history as JSON Lines."
+    option_list = BaseCommand.option_list + (
+        make_option('--output',
+            action='store',
+            dest='output',
+            default=None,
+            help="File to write to instead of standard output."
+        ),
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=None,
+            help="Number of rows to read per query."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Usage: export_tasks {args}".format(args=self.args))
+        try:
+            user = get_user_model().objects.get(email=args[0])
+        except get_user_model().DoesNotExist:
+            raise CommandError("No user with email {email}.".format(email=args[0]))
+        output = open(options['output'], 'w') if options['output'] else self.stdout
+        try:
+            for line in export_lines(user.pk, options['batch_size']):
+                output.write(line)
+        finally:
+            if output is not self.stdout:
+                output.close()
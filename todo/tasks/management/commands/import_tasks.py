@@ -0,0 +1,51 @@
+from optparse import make_option
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.transfer import Importer
+
+class Command(BaseCommand):
+    """Reads tasks, history and task state written by ``export_tasks`` into \
+    a user's account.
+
+    Tasks get new ids, and history and rollups follow them. Rows are \
+    inserted in batches and task state is restored in one round trip per \
+    batch. Importing the same export twice creates the tasks twice.
+
+    """
+    args = '<email>'
+    help = "Imports tasks and history exported by export_tasks for a user."
+    option_list = BaseCommand.option_list + (
+        make_option('--input',
+            action='store',
+            dest='input',
+            default=None,
+            help="File to read from instead of standard input."
+        ),
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=None,
+            help="Number of rows to insert per transaction."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Usage: import_tasks {args}".format(args=self.args))
+        try:
+            user = get_user_model().objects.get(email=args[0])
+        except get_user_model().DoesNotExist:
+            raise CommandError("No user with email {email}.".format(email=args[0]))
+        lines = open(options['input']) if options['input'] else sys.stdin
+        try:
+            counts = Importer(user.pk, options['batch_size']).run(lines)
+        except (KeyError, ValueError) as e:
+            raise CommandError("Invalid export: {error}".format(error=e))
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+        self.stdout.write("Imported {task} tasks, {history} history entries and {rollup} rollups.".format(**counts))
@@ -0,0 +1,240 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from optparse import make_option
+import json
+import math
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.client import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from tasks.backends import command_stats, get_backend
+from tasks.helpers import epoch_milliseconds
+from tasks.models import History, Task
+
+# Seeded users are recognized by their email, which ends with this domain.
+LOAD_TEST_DOMAIN = 'loadtest.invalid'
+
+LOAD_TEST_PASSWORD = 'load-test'
+
+# Relative weights of each kind of request in the generated traffic.
+REQUEST_MIX = (
+    ('list', 40),
+    ('detail', 30),
+    ('current', 15),
+    ('done', 15),
+)
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of a sorted list of values."""
+    if not values:
+        return 0.0
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+class Command(BaseCommand):
+    """Seeds users with tasks and history and drives API traffic against them.
+
+    Requests go through the Django test client, so the whole stack below \
+    the WSGI server is exercised in process: middleware, authentication, \
+    ``TaskResource``, the database and the task state backend configured \
+    by ``TASK_STATE_BACKEND``. Point it at a local redis-server or run it \
+    with the in-memory backend to compare.
+
+    Reports latency percentiles, throughput, and the SQL queries and \
+    backend commands issued per request, overall and for each kind of \
+    request. Seeded users are deleted afterwards unless ``--keep`` is given.
+
+    """
+    help = "Seeds tasks and measures the latency and cost of task API requests."
+    option_list = BaseCommand.option_list + (
+        make_option('--users',
+            action='store',
+            type='int',
+            dest='users',
+            default=10,
+            help="Number of users to seed."
+        ),
+        make_option('--tasks',
+            action='store',
+            type='int',
+            dest='tasks',
+            default=100,
+            help="Number of tasks to seed per user."
+        ),
+        make_option('--history',
+            action='store',
+            type='int',
+            dest='history',
+            default=5,
+            help="Number of history entries to seed per repeatable task."
+        ),
+        make_option('--requests',
+            action='store',
+            type='int',
+            dest='requests',
+            default=1000,
+            help="Number of requests to make."
+        ),
+        make_option('--seed',
+            action='store',
+            type='int',
+            dest='seed',
+            default=0,
+            help="Random seed, so runs with the same options make the same requests."
+        ),
+        make_option('--keep',
+            action='store_true',
+            dest='keep',
+            default=False,
+            help="Keep the seeded users and tasks after the run."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['tasks'] < 1 or options['requests'] < 1:
+            raise CommandError("--users, --tasks and --requests must be positive.")
+        self.random = random.Random(options['seed'])
+        self.clean()
+        users = self.seed(options['users'], options['tasks'], options['history'])
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                results, duration = self.run(users, options['requests'])
+            self.report(results, duration)
+        finally:
+            if not options['keep']:
+                self.clean()
+
+    def seed(self, user_count, task_count, history_count):
+        """Creates users with tasks, history and task state.
+
+        Returns a dictionary of each user id to a list of their task ids.
+
+        """
+        start_time = time.time()
+        password = make_password(LOAD_TEST_PASSWORD)
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(email='user{number}@{domain}'.format(number=number, domain=LOAD_TEST_DOMAIN), name='Load Test', password=password)
+            for number in xrange(user_count)
+        ])
+        user_ids = list(User.objects.filter(email__endswith='@' + LOAD_TEST_DOMAIN).values_list('pk', flat=True))
+        Task.objects.bulk_create([
+            Task(user_id=user_id, title='Task {number}'.format(number=number), is_repeatable=self.random.random() < 0.5)
+            for user_id in user_ids
+            for number in xrange(task_count)
+        ], batch_size=1000)
+        users = defaultdict(list)
+        now = timezone.utc.localize(datetime.utcnow())
+        history = []
+        for task_id, user_id, is_repeatable in Task.objects.filter(user_id__in=user_ids).values_list('pk', 'user_id', 'is_repeatable'):
+            users[user_id].append(task_id)
+            # Reminders are archived at most once.
+            entries = history_count if is_repeatable else self.random.randint(0, 1)
+            history.extend(
+                History(task_id=task_id, done_time=now - timedelta(days=day + 1))
+                for day in xrange(entries)
+            )
+        History.objects.bulk_create(history, batch_size=1000)
+        backend = get_backend()
+        for user_id, task_ids in users.items():
+            states = dict(
+                (task_id, (self.random.random() < 0.3, self.random.random() < 0.1))
+                for task_id in task_ids
+            )
+            backend.set_states(user_id, states, epoch_milliseconds(now))
+        self.stdout.write("Seeded {users} users with {tasks} tasks and {history} history entries in {duration:.2f}s.".format(
+            users=len(users), tasks=sum(len(task_ids) for task_ids in users.values()),
+            history=len(history), duration=time.time() - start_time
+        ))
+        return users
+
+    def clean(self):
+        """Deletes seeded users along with their tasks and task state."""
+        User = get_user_model()
+        user_ids = list(User.objects.filter(email__endswith='@' + LOAD_TEST_DOMAIN).values_list('pk', flat=True))
+        if not user_ids:
+            return
+        backend = get_backend()
+        for user_id in user_ids:
+            task_ids = list(Task.objects.filter(user_id=user_id).values_list('pk', flat=True))
+            backend.set_states(user_id, dict((task_id, (False, False)) for task_id in task_ids), None)
+            backend.clear_done_days(task_ids)
+            backend.claim_archival(user_id)
+        History.objects.filter(task__user_id__in=user_ids).delete()
+        Task.objects.filter(user_id__in=user_ids).delete()
+        User.objects.filter(pk__in=user_ids).delete()
+
+    def run(self, users, request_count):
+        """Makes requests as randomly chosen users.
+
+        Returns a tuple of a list of (kind, status code, latency, SQL \
+        queries, backend commands) for each request and the total duration.
+
+        """
+        clients = {}
+        for user_id in users:
+            client = Client()
+            email = get_user_model().objects.get(pk=user_id).email
+            if not client.login(username=email, password=LOAD_TEST_PASSWORD):
+                raise CommandError("Couldn't log in as {email}.".format(email=email))
+            clients[user_id] = client
+        kinds = [kind for kind, weight in REQUEST_MIX for i in xrange(weight)]
+        results = []
+        # Log queries regardless of DEBUG so that each request's can be counted.
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        start_time = time.time()
+        try:
+            for i in xrange(request_count):
+                user_id = self.random.choice(users.keys())
+                kind = self.random.choice(kinds)
+                task_id = self.random.choice(users[user_id])
+                command_stats.reset()
+                reset_queries()
+                request_start_time = time.time()
+                response = self.request(clients[user_id], kind, task_id)
+                latency = time.time() - request_start_time
+                results.append((kind, response.status_code, latency, len(connection.queries), command_stats.commands))
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+        return results, time.time() - start_time
+
+    def request(self, client, kind, task_id):
+        """Makes one request of the given kind for the given task."""
+        if kind == 'list':
+            return client.get('/api/tasks/')
+        if kind == 'detail':
+            return client.get('/api/tasks/{task_id}/'.format(task_id=task_id))
+        change = {'id': task_id, kind: self.random.random() < 0.5}
+        return client.post('/api/tasks/batch/', json.dumps({'objects': [change]}), content_type='application/json')
+
+    def report(self, results, duration):
+        """Writes latency, throughput and cost per request for each kind of request and overall."""
+        self.stdout.write("Made {count} requests in {duration:.2f}s ({rate:.1f} requests/s).".format(
+            count=len(results), duration=duration, rate=len(results) / duration if duration > 0 else 0.0
+        ))
+        self.stdout.write("{0:<8} {1:>8} {2:>7} {3:>9} {4:>9} {5:>9} {6:>9} {7:>9}".format(
+            'request', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'commands'
+        ))
+        for kind in [kind for kind, weight in REQUEST_MIX] + ['all']:
+            kind_results = [result for result in results if kind in ('all', result[0])]
+            if not kind_results:
+                continue
+            latencies = sorted(result[2] * 1000 for result in kind_results)
+            self.stdout.write("{0:<8} {1:>8} {2:>7} {3:>9.2f} {4:>9.2f} {5:>9.2f} {6:>9.2f} {7:>9.2f}".format(
+                kind,
+                len(kind_results),
+                sum(1 for result in kind_results if result[1] >= 400),
+                percentile(latencies, 50),
+                percentile(latencies, 95),
+                percentile(latencies, 99),
+                sum(result[3] for result in kind_results) / float(len(kind_results)),
+                sum(result[4] for result in kind_results) / float(len(kind_results)),
+            ))
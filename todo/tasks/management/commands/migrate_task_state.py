@@ -0,0 +1,79 @@
+from optparse import make_option
+import dateutil.parser
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.backends import get_backend
+from tasks.backends.redis_backend import RedisBackend, current_key, done_key
+from tasks.helpers import epoch_milliseconds
+from tasks.models import Task
+
+class Command(BaseCommand):
+    """Moves task state out of the global todo:current and todo:done sets \
+    into the per-user sets.
+
+    Done times stored in the legacy todo#{id} hashes are moved into the \
+    per-user sorted sets of done tasks and the hashes are deleted.
+
+    Safe to run while the site is up: tasks are moved in batches, and each \
+    batch adds the ids to their owners' sets and removes them from the \
+    global set in one transaction. Ids of tasks that no longer exist are \
+    dropped. Run until the global sets are gone.
+
+    """
+    help = "Moves task state from the global Redis sets into per-user sets."
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=500,
+            help="Number of task ids to move per round trip."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not isinstance(backend, RedisBackend):
+            raise CommandError("Legacy task state can only be migrated with the Redis backend.")
+        self.redis_client = backend.client
+        self.batch_size = options['batch_size']
+        self.migrate('todo:current', self.move_current)
+        self.migrate('todo:done', self.move_done)
+
+    def migrate(self, legacy_key, move):
+        """Moves batches of task ids out of the given global set until it's empty."""
+        moved = 0
+        while True:
+            task_ids = self.redis_client.srandmember(legacy_key, self.batch_size)
+            if not task_ids:
+                break
+            owners = dict(
+                Task.objects.filter(pk__in=task_ids).values_list('pk', 'user_id')
+            )
+            redis_pipeline = self.redis_client.pipeline()
+            move(redis_pipeline, task_ids, owners)
+            for task_id in task_ids:
+                redis_pipeline.srem(legacy_key, task_id)
+            redis_pipeline.execute()
+            moved += len(task_ids)
+        self.stdout.write("Moved {count} task ids out of {key}.".format(count=moved, key=legacy_key))
+
+    def move_current(self, redis_pipeline, task_ids, owners):
+        for task_id in task_ids:
+            user_id = owners.get(int(task_id))
+            if user_id is not None:
+                redis_pipeline.sadd(current_key(user_id), task_id)
+
+    def move_done(self, redis_pipeline, task_ids, owners):
+        task_keys = ['todo#{task_id}'.format(task_id=task_id) for task_id in task_ids]
+        lookup_pipeline = self.redis_client.pipeline(transaction=False)
+        for task_key in task_keys:
+            lookup_pipeline.hget(task_key, 'done_time')
+        done_times = lookup_pipeline.execute()
+        for task_id, task_key, done_time in zip(task_ids, task_keys, done_times):
+            user_id = owners.get(int(task_id))
+            if user_id is not None and done_time is not None:
+                done_time = epoch_milliseconds(dateutil.parser.parse(done_time))
+                redis_pipeline.zadd(done_key(user_id), done_time, task_id)
+            redis_pipeline.delete(task_key)
@@ -0,0 +1,142 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .backends import command_stats
+from .routers import replica_state
+
+logger = logging.getLogger(__name__)
+
+# Cookie marking a client that wrote within the last REPLICA_PIN_SECONDS.
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Methods of requests that don't change anything, whose reads may go to replicas.
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class RequestCostMiddleware(object):
+    """Accounts for the SQL queries and Redis commands made by each request.
+
+    Counts and total times are added to the response as ``X-SQL-Queries``, \
+    ``X-SQL-Time``, ``X-Redis-Commands`` and ``X-Redis-Time`` headers (times \
+    in milliseconds) and logged as one key=value line per request.
+
+    SQL queries are only counted by logging them, which costs memory and \
+    time on every query, so outside of DEBUG they're counted for a random \
+    ``REQUEST_COST_SQL_SAMPLE_RATE`` fraction of requests. Other requests \
+    leave out the SQL headers and log their SQL costs as '-'.
+
+    Requests that go over a budget in ``REQUEST_BUDGETS`` are logged as \
+    warnings instead. Budgets are keyed by URL name, with '*' for views \
+    that aren't listed, and can limit any of 'sql_queries', 'sql_time', \
+    'redis_commands' and 'redis_time'.
+
+    Should come first in ``MIDDLEWARE_CLASSES`` so that queries made by \
+    other middleware, like loading the session and user, are counted.
+
+    """
+    def process_request(self, request):
+        request.cost_start_time = time.time()
+        request.cost_query_offsets = None
+        request.cost_debug_cursors = {}
+        if settings.DEBUG or random.random() < getattr(settings, 'REQUEST_COST_SQL_SAMPLE_RATE', 0):
+            request.cost_query_offsets = {}
+            for connection in connections.all():
+                # Log queries even when DEBUG is off. Only this request's queries are counted.
+                request.cost_debug_cursors[connection.alias] = connection.use_debug_cursor
+                request.cost_query_offsets[connection.alias] = len(connection.queries)
+                connection.use_debug_cursor = True
+        command_stats.reset()
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'cost_start_time'):
+            # An earlier middleware answered without reaching process_request.
+            return response
+        cost = self.get_cost(request)
+        if cost['sql_queries'] is not None:
+            response['X-SQL-Queries'] = str(cost['sql_queries'])
+            response['X-SQL-Time'] = '{0:.2f}'.format(cost['sql_time'])
+        response['X-Redis-Commands'] = str(cost['redis_commands'])
+        response['X-Redis-Time'] = '{0:.2f}'.format(cost['redis_time'])
+        view_name = self.get_view_name(request)
+        over_budget = self.get_over_budget(view_name, cost)
+        line = ' '.join([
+            'method={method}'.format(method=request.method),
+            'path={path}'.format(path=request.path),
+            'view={view}'.format(view=view_name or '-'),
+            'status={status}'.format(status=response.status_code),
+            'duration={duration:.2f}'.format(duration=(time.time() - request.cost_start_time) * 1000),
+            self.format_sql_cost(cost),
+            'redis_commands={redis_commands} redis_time={redis_time:.2f}'.format(**cost),
+        ])
+        if over_budget:
+            logger.warning("%s over_budget=%s", line, ','.join(over_budget))
+        else:
+            logger.info(line)
+        return response
+
+    def get_cost(self, request):
+        """Returns the SQL queries and Redis commands made since the request started, \
+        restoring each connection's query logging.
+
+        The SQL costs are None if the request's queries weren't counted.
+
+        """
+        cost = {
+            'sql_queries': None,
+            'sql_time': None,
+            'redis_commands': command_stats.commands,
+            'redis_time': command_stats.duration * 1000,
+        }
+        if request.cost_query_offsets is not None:
+            queries = []
+            for connection in connections.all():
+                queries.extend(connection.queries[request.cost_query_offsets.get(connection.alias, 0):])
+                if connection.alias in request.cost_debug_cursors:
+                    connection.use_debug_cursor = request.cost_debug_cursors[connection.alias]
+            cost['sql_queries'] = len(queries)
+            cost['sql_time'] = sum(float(query['time']) for query in queries) * 1000
+        return cost
+
+    def format_sql_cost(self, cost):
+        """Returns the key=value pairs of the SQL costs for the log line."""
+        if cost['sql_queries'] is None:
+            return 'sql_queries=- sql_time=-'
+        return 'sql_queries={sql_queries} sql_time={sql_time:.2f}'.format(**cost)
+
+    def get_view_name(self, request):
+        """Returns the namespaced URL name of the view that handled the request, if any."""
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return None
+        return ':'.join(match.namespaces + [match.url_name])
+
+    def get_over_budget(self, view_name, cost):
+        """Returns the names of the costs over the budget for the given view."""
+        budgets = getattr(settings, 'REQUEST_BUDGETS', {})
+        budget = budgets.get(view_name, budgets.get('*', {}))
+        # SQL costs that weren't counted can't be over budget.
+        return sorted(name for name, limit in budget.items() if cost.get(name) is not None and cost[name] > limit)
+
+class ReplicaPinningMiddleware(object):
+    """Lets each request's reads go to replicas, except for clients that \
+    wrote recently.
+
+    Requests with unsafe methods or the pin cookie read from the primary. \
+    A request that writes sets the cookie for ``REPLICA_PIN_SECONDS``, so \
+    the client's next requests see the write even before it reaches the \
+    replicas. Reads made while streaming a response, after this middleware \
+    is done, go to the primary.
+
+    """
+    def process_request(self, request):
+        pinned = request.method not in SAFE_METHODS or REPLICA_PIN_COOKIE in request.COOKIES
+        replica_state.reset(use_replicas=True, pinned=pinned)
+
+    def process_response(self, request, response):
+        if replica_state.wrote:
+            response.set_cookie(REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        replica_state.reset()
+        return response
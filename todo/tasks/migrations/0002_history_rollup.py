@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'History', fields ['task', 'done_time']
+        db.create_index(u'tasks_history', ['task_id', 'done_time'])
+
+        # Adding model 'HistoryRollup'
+        db.create_table(u'tasks_historyrollup', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('task', self.gf('django.db.models.fields.related.ForeignKey')(related_name='rollups', to=orm['tasks.Task'])),
+            ('month', self.gf('django.db.models.fields.DateField')()),
+            ('count', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('first_done_time', self.gf('django.db.models.fields.DateTimeField')()),
+            ('last_done_time', self.gf('django.db.models.fields.DateTimeField')()),
+        ))
+        db.send_create_signal(u'tasks', ['HistoryRollup'])
+
+        # Adding unique constraint on 'HistoryRollup', fields ['task', 'month']
+        db.create_unique(u'tasks_historyrollup', ['task_id', 'month'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'HistoryRollup', fields ['task', 'month']
+        db.delete_unique(u'tasks_historyrollup', ['task_id', 'month'])
+
+        # Deleting model 'HistoryRollup'
+        db.delete_table(u'tasks_historyrollup')
+
+        # Removing index on 'History', fields ['task', 'done_time']
+        db.delete_index(u'tasks_history', ['task_id', 'done_time'])
+
+
+    models = {
+        u'profiles.user': {
+            'Meta': {'object_name': 'User'},
+            'email': ('django.db.models.fields.EmailField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_admin': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        u'tasks.history': {
+            'Meta': {'index_together': "[('task', 'done_time')]", 'object_name': 'History'},
+            'done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'history'", 'to': u"orm['tasks.Task']"})
+        },
+        u'tasks.historyrollup': {
+            'Meta': {'unique_together': "(('task', 'month'),)", 'object_name': 'HistoryRollup'},
+            'count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'first_done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            'month': ('django.db.models.fields.DateField', [], {}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'rollups'", 'to': u"orm['tasks.Task']"})
+        },
+        u'tasks.task': {
+            'Meta': {'object_name': 'Task'},
+            'description': ('django.db.models.fields.TextField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_repeatable': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'tasks'", 'to': u"orm['profiles.User']"})
+        }
+    }
+
+    complete_apps = ['tasks']
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+# Title matches rank above description matches.
+SEARCH_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}.description, '')), 'B')
+"""
+
+# Statements are run one at a time, since the trigger function's body contains semicolons.
+FORWARD_SQL = [
+    "ALTER TABLE tasks_task ADD COLUMN search_vector tsvector",
+    "UPDATE tasks_task SET search_vector = " + SEARCH_VECTOR.format(row='tasks_task'),
+    "CREATE INDEX tasks_task_search_vector ON tasks_task USING gin(search_vector)",
+    """
+    CREATE FUNCTION tasks_task_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := """ + SEARCH_VECTOR.format(row='NEW') + """;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tasks_task_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description ON tasks_task
+    FOR EACH ROW EXECUTE PROCEDURE tasks_task_search_vector_update()
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER tasks_task_search_vector_update ON tasks_task",
+    "DROP FUNCTION tasks_task_search_vector_update()",
+    "ALTER TABLE tasks_task DROP COLUMN search_vector",
+]
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # The search vector isn't a model field, so it's only ever read through extra().
+        for statement in FORWARD_SQL:
+            db.execute(statement)
+
+
+    def backwards(self, orm):
+        for statement in REVERSE_SQL:
+            db.execute(statement)
+
+
+    models = {
+        u'profiles.user': {
+            'Meta': {'object_name': 'User'},
+            'email': ('django.db.models.fields.EmailField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_admin': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        u'tasks.history': {
+            'Meta': {'index_together': "[('task', 'done_time')]", 'object_name': 'History'},
+            'done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'history'", 'to': u"orm['tasks.Task']"})
+        },
+        u'tasks.historyrollup': {
+            'Meta': {'unique_together': "(('task', 'month'),)", 'object_name': 'HistoryRollup'},
+            'count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'first_done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_done_time': ('django.db.models.fields.DateTimeField', [], {}),
+            'month': ('django.db.models.fields.DateField', [], {}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'rollups'", 'to': u"orm['tasks.Task']"})
+        },
+        u'tasks.task': {
+            'Meta': {'object_name': 'Task'},
+            'description': ('django.db.models.fields.TextField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_repeatable': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'tasks'", 'to': u"orm['profiles.User']"})
+        }
+    }
+
+    complete_apps = ['tasks']
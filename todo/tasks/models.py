@@ -1,58 +1,144 @@
 import calendar
-from datetime import datetime
-import dateutil.parser
+from datetime import date, datetime
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
-import redis
-
-from .helpers import schedule_archival
+from .backends import get_backend
+from .helpers import (
+    STREAK_WINDOW_DAYS, day_number, epoch_milliseconds, from_epoch_milliseconds, local_day_number,
+    schedule_archival, trailing_streak, user_timezone
+)
 
 class TaskManager(models.Manager):
     def get_query_set(self):
         return super(TaskManager, self).get_query_set()
 
-    def current_task_ids(self):
-        """Returns set of task ids for tasks that are in progress."""
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        return redis_client.smembers('todo:current')
-
-    def done_task_ids(self):
-        """Returns set of task ids for tasks that have been done today."""
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        return redis_client.smembers('todo:done')
-
-    def current(self):
-        """Returns all tasks in progress."""
-        current_tasks = self.current_task_ids()
-        return self.filter(pk__in=current_tasks)
-
-    def later(self):
-        """Returns all tasks queued for later."""
-        current_tasks = self.current_task_ids()
-        return self.exclude(pk__in=current_tasks).exclude(
+    def current_task_ids(self, user_id):
+        """Returns set of task ids for the given user's tasks that are in progress."""
+        return get_backend().current_task_ids(user_id)
+
+    def done_task_ids(self, user_id):
+        """Returns set of task ids for the given user's tasks that have been done today."""
+        return get_backend().done_task_ids(user_id)
+
+    def state_task_ids(self, user_ids):
+        """Returns a tuple of the sets of current and done task ids for the given users.
+
+        All sets are fetched in a single round trip so that callers \
+        preparing many tasks at once don't need to query state per task.
+
+        """
+        return get_backend().state_task_ids(user_ids)
+
+    def recently_done(self, user_id, limit):
+        """Returns a list of up to ``limit`` of the given user's tasks done today, newest first."""
+        done_tasks = [int(task_id) for task_id in get_backend().recently_done_task_ids(user_id, limit)]
+        tasks = self.in_bulk(done_tasks)
+        return [tasks[task_id] for task_id in done_tasks if task_id in tasks]
+
+    def with_history(self, queryset=None):
+        """Returns tasks annotated with their history count and latest done time.
+
+        Both are computed in the same query as the tasks themselves, and \
+        ``is_archived``, ``is_done``, ``done_time`` and ``epoch_done_time`` \
+        use them instead of querying history for each task.
+
+        Annotates the given query set if any, or all tasks otherwise. \
+        Filters on history should be applied before annotating.
+
+        """
+        if queryset is None:
+            queryset = self.get_query_set()
+        return queryset.annotate(
+            history_count=models.Count('history'),
+            latest_done_time=models.Max('history__done_time')
+        )
+
+    def current(self, user_id):
+        """Returns all of the given user's tasks in progress."""
+        current_tasks = self.current_task_ids(user_id)
+        return self.with_history(self.filter(user_id=user_id, pk__in=current_tasks))
+
+    def later(self, user_id):
+        """Returns all of the given user's tasks queued for later."""
+        current_tasks = self.current_task_ids(user_id)
+        return self.with_history(self.filter(user_id=user_id).exclude(pk__in=current_tasks).exclude(
             is_repeatable=False,
             history__isnull=False
-        )
+        ))
 
-    def done(self):
-        """Returns all tasks that are done.
+    def done(self, user_id):
+        """Returns all of the given user's tasks that are done.
 
         Tasks that are done are either tasks in the set of current done tasks \
         or reminders that have a history entry.
 
         """
-        done_tasks = self.done_task_ids()
-        return self.filter(
+        done_tasks = self.done_task_ids(user_id)
+        return self.with_history(self.filter(user_id=user_id).filter(
             models.Q(pk__in=done_tasks) |
             models.Q(
                 is_repeatable=False,
                 history__isnull=False
             )
+        ))
+
+    def search(self, user_id, query):
+        """Returns the given user's tasks matching the search query, best match first.
+
+        Matches come from the full-text index over titles and descriptions, \
+        which Postgres keeps up to date with a trigger. Title matches rank \
+        above description matches.
+
+        """
+        return self.filter(user_id=user_id).extra(
+            select={'rank': "ts_rank(search_vector, plainto_tsquery('english', %s))"},
+            select_params=[query],
+            where=["search_vector @@ plainto_tsquery('english', %s)"],
+            params=[query],
+            order_by=['-rank', 'id']
         )
 
+    def set_states(self, user_id, changes):
+        """Marks many of the given user's tasks as current or done at once.
+
+        ``changes`` is a list of dictionaries, each with a task 'id' and \
+        optional 'current' and 'done' flags, applied to the task the same \
+        way as ``Task.set_current`` and then ``Task.set_done``. Ids of \
+        tasks the user doesn't own are ignored.
+
+        History is removed in one transaction, task state is updated in \
+        one round trip and archival is scheduled once for the whole batch.
+
+        Returns the list of changed tasks.
+
+        """
+        changes = dict((int(change['id']), change) for change in changes)
+        tasks = list(self.with_history(self.filter(user_id=user_id, pk__in=changes.keys())))
+        now = epoch_milliseconds(timezone.utc.localize(datetime.utcnow()))
+        states = {}
+        unarchived_tasks = []
+        for task in tasks:
+            change = changes[task.pk]
+            if not task.is_repeatable and task.is_archived():
+                # Archived reminders can only be marked not done, which removes their history.
+                if change.get('done') is False:
+                    unarchived_tasks.append(task.pk)
+                    task.history_count, task.latest_done_time = 0, None
+                    # Recorded as changed without changing its state.
+                    states[task.pk] = (None, None)
+                continue
+            states[task.pk] = (change.get('current'), change.get('done'))
+        if unarchived_tasks:
+            with transaction.commit_on_success():
+                History.objects.filter(task_id__in=unarchived_tasks).delete()
+        get_backend().set_states(user_id, states, now)
+        if any(done for current, done in states.values()):
+            schedule_archival(user_id)
+        return tasks
+
 class Task(models.Model):
     description = models.TextField()
     is_repeatable = models.BooleanField(default=False)
@@ -63,7 +149,10 @@ class Task(models.Model):
 
     def is_archived(self):
         """Returns True if the task has at least one history entry."""
-        return self.history.count() > 0
+        history_count = getattr(self, 'history_count', None)
+        if history_count is None:
+            history_count = self.history.count()
+        return history_count > 0
 
     def is_current(self):
         """Returns True if the task is in progress.
@@ -71,8 +160,7 @@ class Task(models.Model):
         A task is in progress if it exists in the set of current tasks.
 
         """
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        return redis_client.sismember('todo:current', self.pk)
+        return get_backend().is_current(self.user_id, self.pk)
 
     def is_done(self):
         """Returns True if the task is done.
@@ -84,8 +172,7 @@ class Task(models.Model):
         of current done tasks or has a history entry).
 
         """
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        is_done_today = redis_client.sismember('todo:done', self.pk)
+        is_done_today = get_backend().done_time(self.user_id, self.pk) is not None
         if self.is_repeatable:
             return is_done_today 
         else:
@@ -102,11 +189,7 @@ class Task(models.Model):
         """
         if not self.is_repeatable and self.is_archived():
             return
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        if current:
-            redis_client.sadd('todo:current', self.pk)
-        else:
-            redis_client.srem('todo:current', self.pk)
+        get_backend().set_current(self.user_id, self.pk, current)
 
     def set_done(self, done):
         """Marks a task as done or not done.
@@ -122,21 +205,17 @@ class Task(models.Model):
         if not self.is_repeatable and self.is_archived():
             if not done:
                 self.history.all()[0].delete()
+                # History annotations are stale once the entry is gone.
+                self.__dict__.pop('history_count', None)
+                self.__dict__.pop('latest_done_time', None)
+                get_backend().record_changes(self.user_id, [self.pk])
             return
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        redis_pipeline = redis_client.pipeline()
         if done:
-            if not self.is_current():
-                self.set_current(done)
             now = timezone.utc.localize(datetime.utcnow())
-            redis_pipeline.sadd('todo:done', self.pk) \
-                          .hset('todo#{task_id}'.format(task_id=self.pk), 'done_time', now) \
-                          .execute()
-            schedule_archival(self.user.pk)
+            get_backend().set_done(self.user_id, self.pk, epoch_milliseconds(now))
+            schedule_archival(self.user_id)
         else:
-            redis_pipeline.srem('todo:done', self.pk) \
-                          .delete('todo#{task_id}'.format(task_id=self.pk)) \
-                          .execute()
+            get_backend().set_done(self.user_id, self.pk, None)
 
     def done_time(self):
         """Returns the time (in UTC) the task was completed.
@@ -145,16 +224,86 @@ class Task(models.Model):
 
         """
         if self.is_archived():
-            history = self.history.order_by('-done_time')
-            return history[0].done_time
-        redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-        done_time = redis_client.hget('todo#{task_id}'.format(task_id=self.pk), 'done_time')
-        return dateutil.parser.parse(done_time) if done_time is not None else None
+            return self.archived_done_time()
+        epoch_done_time = get_backend().done_time(self.user_id, self.pk)
+        return from_epoch_milliseconds(epoch_done_time) if epoch_done_time is not None else None
 
     def epoch_done_time(self):
         """Returns the done time (in milliseconds) relative to the epoch."""
-        done_time = self.done_time()
-        return int(calendar.timegm(done_time.timetuple())) * 1000 if done_time is not None else None
+        if self.is_archived():
+            return epoch_milliseconds(self.archived_done_time())
+        return get_backend().done_time(self.user_id, self.pk)
+
+    def archived_done_time(self):
+        """Returns the latest done time in the task's history."""
+        if hasattr(self, 'latest_done_time'):
+            return self.latest_done_time
+        return self.history.order_by('-done_time')[0].done_time
+
+    def completion(self, year=None, month=None):
+        """Returns the task's streaks and the days it was done in a month.
+
+        Streaks are counted in consecutive local days in the user's timezone, \
+        from the task's completion bitmap plus its done time if it hasn't \
+        been archived yet, without reading history. Only the month and the \
+        current streak are read from the bitmap; the longest streak is kept \
+        by the backend. The month defaults to the current local month.
+
+        Returns a dictionary with the 'current_streak' and 'longest_streak' \
+        in days, the 'month' as YYYY-MM and the list of 'days' of the month \
+        the task was done on.
+
+        """
+        local_timezone = user_timezone(self.user_id)
+        today = timezone.utc.localize(datetime.utcnow()).astimezone(local_timezone).date()
+        year, month = year or today.year, month or today.month
+        month_days = calendar.monthrange(year, month)[1]
+        first_day = day_number(date(year, month, 1))
+        backend = get_backend()
+        done_time = backend.done_time(self.user_id, self.pk)
+        pending_days = set([local_day_number(done_time, local_timezone)]) if done_time is not None else set()
+        current_streak = self.current_streak(day_number(today), pending_days)
+        done_days = backend.done_days(self.pk, first_day, first_day + month_days - 1) | pending_days
+        return {
+            'current_streak': current_streak,
+            # The current streak can include a day that isn't in the bitmap yet.
+            'longest_streak': max(backend.longest_streak(self.pk), current_streak),
+            'month': '{year:04d}-{month:02d}'.format(year=year, month=month),
+            'days': [day for day in xrange(1, month_days + 1) if first_day + day - 1 in done_days],
+        }
+
+    def current_streak(self, today, pending_days=()):
+        """Returns the task's current streak up to the given day number.
+
+        The completion bitmap is read back from today ``STREAK_WINDOW_DAYS`` \
+        days at a time until the day before the streak is found. \
+        ``pending_days`` are days the task was done that aren't in the \
+        bitmap yet.
+
+        """
+        backend = get_backend()
+        done_days = set(pending_days)
+        streak = 0
+        first_day = today + 1
+        while first_day > 0:
+            last_day = first_day - 1
+            first_day = max(last_day - STREAK_WINDOW_DAYS + 1, 0)
+            done_days.update(backend.done_days(self.pk, first_day, last_day))
+            streak, day_before = trailing_streak(done_days, today)
+            if day_before >= first_day:
+                break
+        return streak
+
+    def save(self, *args, **kwargs):
+        super(Task, self).save(*args, **kwargs)
+        get_backend().record_changes(self.user_id, [self.pk])
+
+    def delete(self, *args, **kwargs):
+        task_id, user_id = self.pk, self.user_id
+        super(Task, self).delete(*args, **kwargs)
+        backend = get_backend()
+        backend.clear_done_days([task_id])
+        backend.record_changes(user_id, [task_id])
 
     def __iter__(self):
         for field in self._meta.get_all_field_names():
@@ -167,8 +316,34 @@ class History(models.Model):
     task = models.ForeignKey(Task, related_name='history')
     done_time = models.DateTimeField()
 
+    class Meta:
+        # Latest done time and history count per task are read from the index alone.
+        index_together = [('task', 'done_time')]
+
     def __unicode__(self):
         return "{task_title} - {done_time}".format(
             task_title=self.task.title,
             done_time=self.done_time
         )
+
+class HistoryRollup(models.Model):
+    """Monthly summary of a task's history entries older than ``HISTORY_RETENTION_DAYS``.
+
+    Months run in UTC, like the done times they summarize.
+
+    """
+    task = models.ForeignKey(Task, related_name='rollups')
+    month = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    first_done_time = models.DateTimeField()
+    last_done_time = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('task', 'month')
+
+    def __unicode__(self):
+        return "{task_title} - {month:%Y-%m} ({count})".format(
+            task_title=self.task.title,
+            month=self.month,
+            count=self.count
+        )
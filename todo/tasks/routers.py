@@ -0,0 +1,55 @@
+"""Routes reads made while serving requests to read replicas.
+
+``DATABASE_REPLICAS`` lists the aliases of replicas of the default \
+database. Reads made by requests go to a random replica, unless the \
+client wrote recently: a request's own reads stay on the primary once it \
+writes, requests with unsafe methods read from the primary throughout, \
+and ``ReplicaPinningMiddleware`` keeps the client on the primary for \
+``REPLICA_PIN_SECONDS`` after a write, so replication lag never hides \
+their own changes from them.
+
+Reads outside requests, like archival in Celery and management commands, \
+and reads inside transactions always go to the primary.
+
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+class ReplicaState(threading.local):
+    """Whether the current thread's reads may go to replicas, and whether \
+    it has written during the current request."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self, use_replicas=False, pinned=False):
+        self.use_replicas = use_replicas
+        self.pinned = pinned
+        self.wrote = False
+
+replica_state = ReplicaState()
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not replica_state.use_replicas or replica_state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].is_managed():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        replica_state.pinned = True
+        replica_state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_syncdb(self, db, model):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
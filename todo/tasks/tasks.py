@@ -1,55 +1,195 @@
+from collections import defaultdict
+from datetime import date, timedelta
+import logging
+import time
+
 from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 
 import celery
-import redis
-from redis.exceptions import WatchError
+
+from .backends import get_backend
+from .helpers import (
+    epoch_milliseconds, from_epoch_milliseconds, last_midnight, local_day_number, schedule_archival, user_timezone
+)
+
+logger = logging.getLogger(__name__)
+
+@celery.task
+def archive_tasks(user_id, scheduled=False):
+    """Clears done tasks from the task state backend and archives information \
+    in the main database for the user with the given user id.
+
+    Done state is snapshotted and cleared atomically, so tasks marked done \
+    during archiving either make it into this snapshot or stay done for \
+    the next one, and the job finishes in a fixed number of round trips \
+    regardless of concurrent writes.
+
+    The snapshot is staged until the history entries are written. If \
+    writing fails, the next run resumes from the staged snapshot, which \
+    is counted under 'resumed' in the archival stats. A resumed run skips \
+    the entries the failed run already committed.
+
+    A ``scheduled`` archival, as queued by ``sweep_archival``, only takes \
+    tasks done before the user's latest local midnight, since it can run \
+    well past midnight, and schedules archival of the tasks done since. \
+    If it fails, the user is put back in the schedule after \
+    ``ARCHIVAL_RETRY_DELAY`` seconds, since the sweep already claimed them.
+
+    """
+    start_time = time.time()
+    backend = get_backend()
+    before = epoch_milliseconds(last_midnight(user_timezone(user_id))) if scheduled else None
+    try:
+        resumed, task_history = backend.snapshot_done(user_id, before)
+        # Create history entries for each task after the state cleanup.
+        count = write_history(user_id, task_history, skip_existing=resumed)
+        backend.finish_archival(user_id, task_history.keys(), resumed, count, time.time() - start_time)
+    except Exception:
+        if scheduled:
+            backend.schedule_archival(user_id, time.time() + getattr(settings, 'ARCHIVAL_RETRY_DELAY', 300))
+        raise
+    if scheduled:
+        # Tasks marked done while this archival was pending weren't scheduled.
+        schedule_archival(user_id)
+    return count
 
 @celery.task
-def archive_tasks(user_id):
-    """Clears done tasks from Redis and archives information in the main \
-    database for the user with the given user id.
+def sweep_archival():
+    """Queues archival for users whose scheduled archival time has passed.
+
+    At most ``ARCHIVAL_SWEEP_LIMIT`` users are queued per run. The rest \
+    stay in the schedule for the next run, which spreads the load when \
+    many users share a timezone. Each user is removed from the schedule \
+    before being queued so concurrent sweeps never queue a user twice, \
+    and ``archive_tasks`` puts them back if their archival fails.
 
-    If a new task is marked done during archiving, restart the job so \
-    it gets cleaned up as well.
-    
-    Without cleaning up tasks marked done during this job, there are \
-    no guarantees that it will be cleaned up next midnight, particularly \
-    if no subsequent tasks are marked done later that day.
+    Returns the number of users queued.
 
     """
-    redis_client = redis.StrictRedis(connection_pool=settings.REDIS_POOL)
-    redis_pipeline = redis_client.pipeline()
-    user_key = 'user#{user_id}'.format(user_id=user_id)
+    backend = get_backend()
+    limit = getattr(settings, 'ARCHIVAL_SWEEP_LIMIT', 500)
+    count = 0
+    for user_id in backend.due_archivals(time.time(), limit):
+        if backend.claim_archival(user_id):
+            archive_tasks.delay(user_id, scheduled=True)
+            count += 1
+    return count
+
+@celery.task
+def rollup_history():
+    """Compacts history entries older than ``HISTORY_RETENTION_DAYS`` into \
+    monthly rollups per task, keeping the table's size bounded.
+
+    Each task's latest history entry is always kept, so done times and \
+    archived reminders don't change. Entries are rolled up in chunks of \
+    ``ARCHIVE_BATCH_SIZE``, each chunk in its own transaction, so the job \
+    can be stopped and rerun at any point.
+
+    Returns the number of history entries rolled up.
+
+    """
+    # Import models here since importing at the top of the module raises ImportError.
+    from .models import History, HistoryRollup
+    batch_size = getattr(settings, 'ARCHIVE_BATCH_SIZE', 500)
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'HISTORY_RETENTION_DAYS', 90))
+    old_entries = History.objects.filter(done_time__lt=cutoff).order_by('pk').values_list('pk', 'task_id', 'done_time')
+    last_pk = 0
+    count = 0
     while True:
-        try:
-            task_history = {}
-            redis_pipeline.watch('todo:done')
-            task_ids = redis_pipeline.smembers('todo:done')
-            # First iteration over task ids sets watches and aggregates task info.
-            for task_id in task_ids:
-                # Collect the done times for each task in a dictionary.
-                task_key = 'todo#{task_id}'.format(task_id=task_id)
-                redis_pipeline.watch(task_key)
-                done_time = redis_pipeline.hget(task_key, 'done_time')
-                task_history[task_id] = done_time
-            redis_pipeline.multi()
-            # Second iteration builds the transaction to clean up temporary task info.
-            for task_id in task_ids:
-                task_key = 'todo#{task_id}'.format(task_id=task_id)
-                redis_pipeline.srem('todo:current', task_id) \
-                              .srem('todo:done', task_id) \
-                              .delete(task_key)
-            # Remove the stored archival task id so a new archival can be scheduled later.
-            redis_pipeline.hdel(user_key, 'archive_task_id') \
-                          .execute()
+        entries = list(old_entries.filter(pk__gt=last_pk)[:batch_size])
+        if not entries:
             break
-        except WatchError:
-            continue
-        finally:
-            redis_pipeline.reset()
-    # Create history entries for each task after the Redis cleanup.
-    # Import Task here since importing at the top of the module raises ImportError.
-    from .models import Task
-    for task_id, done_time in task_history.iteritems():
-        task = Task.objects.get(pk=task_id)
-        task.history.create(done_time=done_time)
+        last_pk = entries[-1][0]
+        task_ids = set(task_id for pk, task_id, done_time in entries)
+        with transaction.commit_on_success():
+            latest_done_times = dict(
+                (latest['task_id'], latest['latest_done_time'])
+                for latest in History.objects.filter(task_id__in=task_ids).values('task_id').annotate(latest_done_time=models.Max('done_time'))
+            )
+            months = defaultdict(list)
+            rolled_up = []
+            for pk, task_id, done_time in entries:
+                if done_time == latest_done_times[task_id]:
+                    continue
+                months[(task_id, date(done_time.year, done_time.month, 1))].append(done_time)
+                rolled_up.append(pk)
+            if not rolled_up:
+                continue
+            rollups = dict(
+                ((rollup.task_id, rollup.month), rollup)
+                for rollup in HistoryRollup.objects.select_for_update().filter(
+                    task_id__in=set(task_id for task_id, month in months),
+                    month__in=set(month for task_id, month in months)
+                )
+            )
+            new_rollups = []
+            for (task_id, month), done_times in months.items():
+                rollup = rollups.get((task_id, month))
+                if rollup is None:
+                    new_rollups.append(HistoryRollup(
+                        task_id=task_id, month=month, count=len(done_times),
+                        first_done_time=min(done_times), last_done_time=max(done_times)
+                    ))
+                else:
+                    rollup.count += len(done_times)
+                    rollup.first_done_time = min([rollup.first_done_time] + done_times)
+                    rollup.last_done_time = max([rollup.last_done_time] + done_times)
+                    rollup.save()
+            HistoryRollup.objects.bulk_create(new_rollups)
+            History.objects.filter(pk__in=rolled_up).delete()
+        count += len(rolled_up)
+    logger.info("Rolled up %d history entries older than %s.", count, cutoff)
+    return count
+
+def write_history(user_id, task_history, skip_existing=False):
+    """Bulk creates history entries from a dictionary of task ids to done times \
+    in milliseconds since the epoch.
+
+    Entries are inserted in chunks of ``ARCHIVE_BATCH_SIZE`` rows, each \
+    chunk in its own transaction. Ids of tasks deleted since they were \
+    marked done are skipped. With ``skip_existing``, entries already in \
+    the history are skipped too, so rewriting the history of a write that \
+    failed partway doesn't duplicate the chunks that were committed.
+
+    The local day each repeatable task was done on, in the user's \
+    timezone, is also set in the task's completion bitmap.
+
+    Returns the number of history entries created.
+
+    """
+    # Import models here since importing at the top of the module raises ImportError.
+    from .models import History, Task
+    batch_size = getattr(settings, 'ARCHIVE_BATCH_SIZE', 500)
+    local_timezone = user_timezone(user_id)
+    backend = get_backend()
+    task_ids = sorted(task_history.keys())
+    start_time = time.time()
+    count = 0
+    for offset in xrange(0, len(task_ids), batch_size):
+        chunk = task_ids[offset:offset + batch_size]
+        with transaction.commit_on_success():
+            existing_tasks = list(Task.objects.filter(pk__in=chunk).values_list('pk', 'is_repeatable'))
+            entries = [
+                History(task_id=task_id, done_time=from_epoch_milliseconds(task_history[str(task_id)]))
+                for task_id, is_repeatable in existing_tasks
+            ]
+            if skip_existing:
+                written = set(History.objects.filter(
+                    task__in=[entry.task_id for entry in entries],
+                    done_time__in=[entry.done_time for entry in entries]
+                ).values_list('task_id', 'done_time'))
+                entries = [entry for entry in entries if (entry.task_id, entry.done_time) not in written]
+            History.objects.bulk_create(entries)
+        backend.set_done_days(dict(
+            (task_id, [local_day_number(task_history[str(task_id)], local_timezone)])
+            for task_id, is_repeatable in existing_tasks if is_repeatable
+        ))
+        count += len(entries)
+    duration = time.time() - start_time
+    logger.info(
+        "Archived %d history entries for user %s in %.3fs (%.1f rows/s).",
+        count, user_id, duration, count / duration if duration > 0 else 0.0
+    )
+    return count
@@ -0,0 +1,16 @@
+from django import template
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.utils.html import format_html_join
+
+from ..assets import bundle_files
+
+register = template.Library()
+
+@register.simple_tag
+def assets(bundle_name):
+    """Renders the script or stylesheet tags for the given bundle in ``ASSET_BUNDLES``."""
+    if bundle_name.endswith('.css'):
+        tag = '<link rel="stylesheet" href="{0}" />'
+    else:
+        tag = '<script src="{0}"></script>'
+    return format_html_join('\n', tag, ((static(name),) for name in bundle_files(bundle_name)))
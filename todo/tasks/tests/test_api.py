@@ -1,18 +1,23 @@
+import json
+from datetime import datetime
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.test.client import Client
 from django.test.utils import override_settings
+from django.utils import timezone
 
 from mock import patch
-import redis
 from tastypie.test import ResourceTestCase
 
+from ..backends import get_backend
+from ..helpers import day_number
 from ..models import Task, History
 
 @override_settings(
-    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
 )
 class TaskResourceTest(ResourceTestCase):
     def setUp(self):
@@ -21,33 +26,38 @@ class TaskResourceTest(ResourceTestCase):
         self.password = 'test'
         self.user = get_user_model().objects.create_user(email=self.username, name='test', password=self.password)
         self.reminder = self.user.tasks.create(title='Reminder')
-        self.routine = self.user.tasks.create(title='Routine', is_routine=True)
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
         super(TaskResourceTest, self).setUp()
 
     def tearDown(self):
-        redis.StrictRedis(connection_pool=settings.REDIS_POOL).flushdb()
+        get_backend().flush()
 
     def get_credentials(self):
         return self.api_client.client.login(username=self.username, password=self.password)
 
-    def reverse_api_url(self, url_name, **kwargs):
-        api_kwargs = {'api_name': 'api', 'resource_name': 'todo'}
-        api_kwargs.update(kwargs)
-        return reverse(url_name, kwargs=api_kwargs)
-
     def get_task_list_uri(self):
         """Returns the URI for all tasks."""
-        # return reverse('api_dispatch_list', kwargs={'api_name': 'api', 'resource_name': 'todo'})
-        return self.reverse_api_url('api_dispatch_list')
+        return reverse('api_task_list')
 
     def get_task_uri(self, pk):
         """Returns the URI for a specific task."""
-        return self.reverse_api_url('api_dispatch_detail', pk=pk)
+        return reverse('api_task_detail', kwargs={'pk': pk})
+
+    def get_task_data(self, task, current=False, done=False):
+        """Returns the data the API responds with for the task in the given state."""
+        return {
+            'id': task.pk,
+            'title': task.title,
+            'repeatable': task.is_repeatable,
+            'current': current,
+            'done': done,
+            'archived': False
+        }
 
     def test_resource_uris(self):
         """Checks that the generated URIs are correct."""
-        self.assertEqual(self.get_task_list_uri(), '/api/todo')
-        self.assertEqual(self.get_task_uri(self.reminder.pk), '/api/todo/{pk}'.format(pk=self.reminder.pk))
+        self.assertEqual(self.get_task_list_uri(), '/api/tasks/')
+        self.assertEqual(self.get_task_uri(self.reminder.pk), '/api/tasks/{pk}/'.format(pk=self.reminder.pk))
 
     def test_get_task_list_unauthorized(self):
         """Makes a GET request for a list of tasks without the proper credentials and checks that it's invalid."""
@@ -60,94 +70,39 @@ class TaskResourceTest(ResourceTestCase):
         response = self.api_client.get(task_list_uri, authentication=self.get_credentials())
         self.assertValidJSONResponse(response)
         response = self.deserialize(response)
-        self.assertEqual(len(response['objects']), 2)
-        self.assertEqual(
-            response['objects'][1],
-            {
-                'id': self.reminder.pk,
-                'title': 'Reminder',
-                'current': False,
-                'done': False,
-                'routine': False,
-                'resource_uri': '/api/todo/{pk}'.format(pk=self.reminder.pk),
-                'user': self.user.email
-            }
-        )
-        self.assertEqual(
-            response['objects'][0],
-            {
-                'id': self.routine.pk,
-                'title': 'Routine',
-                'current': False,
-                'done': False,
-                'routine': True,
-                'resource_uri': '/api/todo/{pk}'.format(pk=self.routine.pk),
-                'user': self.user.email
-            }
-        )
+        self.assertEqual(response['objects'], [self.get_task_data(self.reminder), self.get_task_data(self.routine)])
 
     def test_get_current_task_list(self):
-        """Makes a GET request for a list of tasks and filter on current tasks."""
+        """Makes a GET request for a list of tasks and checks the current tasks."""
         self.reminder.set_current(True)
-        response = self.api_client.get(self.reverse_api_url('api_get_current_tasks'), authentication=self.get_credentials())
+        response = self.api_client.get(self.get_task_list_uri(), authentication=self.get_credentials())
         self.assertValidJSONResponse(response)
         response = self.deserialize(response)
-        self.assertEqual(len(response['objects']), 1)
-        self.assertEqual(
-            response['objects'][0],
-            {
-                'id': self.reminder.pk,
-                'title': 'Reminder',
-                'current': True,
-                'done': False,
-                'routine': False,
-                'resource_uri': '/api/todo/{pk}'.format(pk=self.reminder.pk),
-                'user': self.user.email
-            }
-        )
+        self.assertEqual([task for task in response['objects'] if task['current']], [
+            self.get_task_data(self.reminder, current=True)
+        ])
 
     def test_get_later_task_list(self):
-        """Makes a GET request for a list of tasks and filter on later tasks."""
+        """Makes a GET request for a list of tasks and checks the later tasks."""
         self.reminder.set_current(True)
-        response = self.api_client.get(self.reverse_api_url('api_get_later_tasks'), authentication=self.get_credentials())
+        response = self.api_client.get(self.get_task_list_uri(), authentication=self.get_credentials())
         self.assertValidJSONResponse(response)
         response = self.deserialize(response)
-        self.assertEqual(len(response['objects']), 1)
-        self.assertEqual(
-            response['objects'][0],
-            {
-                'id': self.routine.pk,
-                'title': 'Routine',
-                'current': False,
-                'done': False,
-                'routine': True,
-                'resource_uri': '/api/todo/{pk}'.format(pk=self.routine.pk),
-                'user': self.user.email
-            }
-        )
+        self.assertEqual([task for task in response['objects'] if not task['current']], [
+            self.get_task_data(self.routine)
+        ])
 
     @patch('tasks.models.schedule_archival')
     def test_get_done_task_list(self, mock_schedule_archival):
-        """Makes a GET request for a list of tasks and filter on done tasks."""
+        """Makes a GET request for a list of tasks and checks the done tasks."""
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
-        response = self.api_client.get(self.reverse_api_url('api_get_done_tasks'), authentication=self.get_credentials())
+        response = self.api_client.get(self.get_task_list_uri(), authentication=self.get_credentials())
         self.assertValidJSONResponse(response)
         response = self.deserialize(response)
-        self.assertEqual(len(response['objects']), 1)
-        self.assertEqual(
-            response['objects'][0],
-            {
-                'id': self.reminder.pk,
-                'title': 'Reminder',
-                'current': True,
-                'done': True,
-                'doneTime': self.reminder.epoch_done_time(),
-                'routine': False,
-                'resource_uri': '/api/todo/{pk}'.format(pk=self.reminder.pk),
-                'user': self.user.email
-            }
-        )
+        self.assertEqual([task for task in response['objects'] if task['done']], [
+            self.get_task_data(self.reminder, current=True, done=True)
+        ])
 
     def test_get_task_unauthorized(self):
         """Makes a GET request for a single task without the proper credentials and checks that it's invalid."""
@@ -159,56 +114,28 @@ class TaskResourceTest(ResourceTestCase):
         task_uri = self.get_task_uri(self.reminder.pk)
         response = self.api_client.get(task_uri, authentication=self.get_credentials())
         self.assertValidJSONResponse(response)
-        self.assertEqual(
-            self.deserialize(response),
-            {
-                'id': self.reminder.pk,
-                'title': 'Reminder',
-                'current': False,
-                'done': False,
-                'routine': False,
-                'resource_uri': task_uri,
-                'user': self.user.email
-            }
-        )
+        self.assertEqual(self.deserialize(response), self.get_task_data(self.reminder))
 
     def test_post_task_unauthorized(self):
         """Makes a POST request to create a single task without the proper credentials and checks that it's invalid."""
         self.assertEqual(Task.objects.count(), 2)
         data = {
             'title': 'New Task',
-            'current': True,
-            'done': False,
-            'routine': True
+            'repeatable': True
         }
         response = self.api_client.post(self.get_task_list_uri(), data=data)
         self.assertHttpUnauthorized(response)
         self.assertEqual(Task.objects.count(), 2)
 
     def test_post_task(self):
-        """Makes a POST request to create a single task and checks that a new task is created."""
-        self.assertEqual(Task.objects.count(), 2)
+        """Makes a POST request to create a single task and checks that it's not implemented."""
         data = {
             'title': 'New Task',
-            'current': True,
-            'done': False,
-            'routine': True
+            'repeatable': True
         }
         response = self.api_client.post(self.get_task_list_uri(), data=data, authentication=self.get_credentials())
-        self.assertHttpCreated(response)
-        self.assertEqual(Task.objects.count(), 3)
-        self.assertEqual(
-            self.deserialize(response),
-            {
-                'id': self.routine.pk + 1,
-                'title': 'New Task',
-                'current': True,
-                'done': False,
-                'routine': True,
-                'resource_uri': self.get_task_uri(self.routine.pk + 1),
-                'user': self.user.email
-            }
-        )
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(Task.objects.count(), 2)
 
     def test_put_task_unauthorized(self):
         """Makes a PUT request for a single task without the proper credentials and checks that it's invalid."""
@@ -217,28 +144,18 @@ class TaskResourceTest(ResourceTestCase):
         self.api_client.client.logout()
         new_data = old_data.copy()
         new_data['title'] = 'Task X'
-        new_data['current'] = True
-        new_data['done'] = True
         self.assertHttpUnauthorized(self.api_client.put(task_uri, data=new_data))
-        task = Task.objects.get(pk=self.reminder.pk)
-        self.assertFalse(task.is_current())
-        self.assertFalse(task.is_done())
+        self.assertEqual(Task.objects.get(pk=self.reminder.pk).title, 'Reminder')
 
-    @patch('tasks.models.schedule_archival')
-    def test_put_task(self, mock_schedule_archival):
-        """Make a PUT request for a single task and checks that the task data is updated."""
+    def test_put_task(self):
+        """Makes a PUT request for a single task and checks that it's not implemented."""
         task_uri = self.get_task_uri(self.reminder.pk)
         old_data = self.deserialize(self.api_client.get(task_uri, authentication=self.get_credentials()))
         new_data = old_data.copy()
         new_data['title'] = 'Task X'
-        new_data['current'] = True
-        new_data['done'] = True
-        self.api_client.put(task_uri, data=new_data, authentication=self.get_credentials())
-        mock_schedule_archival.assert_called_once()
-        task = Task.objects.get(pk=self.reminder.pk)
-        self.assertEqual(task.title, 'Task X')
-        self.assertTrue(task.is_current())
-        self.assertTrue(task.is_done())
+        response = self.api_client.put(task_uri, data=new_data, authentication=self.get_credentials())
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(Task.objects.get(pk=self.reminder.pk).title, 'Reminder')
 
     def test_delete_task_unauthorized(self):
         """Makes a DELETE request for a single task without the proper credentials and checks that it's invalid."""
@@ -248,8 +165,296 @@ class TaskResourceTest(ResourceTestCase):
         self.assertEqual(Task.objects.count(), 2)
 
     def test_delete_task(self):
-        """Makes a DELETE request for a single task and checks that it's deleted."""
-        self.assertEqual(Task.objects.count(), 2)
+        """Makes a DELETE request for a single task and checks that it's not implemented."""
         task_uri = self.get_task_uri(self.reminder.pk)
-        self.api_client.delete(task_uri, authentication=self.get_credentials())
-        self.assertEqual(Task.objects.count(), 1)
+        response = self.api_client.delete(task_uri, authentication=self.get_credentials())
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(Task.objects.count(), 2)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def get_page(self, **params):
+        response = self.client.get('/api/tasks/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_list_pages_by_cursor(self):
+        """Requests the task list one task at a time and checks that each page links to the next."""
+        page = self.get_page(limit=1)
+        self.assertEqual([task['id'] for task in page['objects']], [self.reminder.pk])
+        self.assertEqual(page['meta']['next'], self.reminder.pk)
+        page = self.get_page(limit=1, after=page['meta']['next'])
+        self.assertEqual([task['id'] for task in page['objects']], [self.routine.pk])
+        self.assertEqual(page['meta']['next'], None)
+
+    @override_settings(TASK_MAX_PAGE_SIZE=1)
+    def test_list_page_size_capped(self):
+        """Requests more tasks than the maximum page size and checks that only a full page is returned."""
+        page = self.get_page(limit=10)
+        self.assertEqual(len(page['objects']), 1)
+        self.assertEqual(page['meta']['next'], self.reminder.pk)
+
+    def test_list_invalid_cursor(self):
+        """Requests the task list with a non-integer cursor and checks that it's a bad request."""
+        response = self.client.get('/api/tasks/', {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_excludes_other_users_tasks(self):
+        """Creates a task for another user and checks that it's not in the task list."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_user.tasks.create(title='Other')
+        page = self.get_page()
+        self.assertEqual([task['id'] for task in page['objects']], [self.reminder.pk, self.routine.pk])
+
+    def test_list_marks_archived_tasks(self):
+        """Archives the reminder and checks that the list marks it archived for clients to keep out of later."""
+        History.objects.create(task=self.reminder, done_time=timezone.now())
+        page = self.get_page()
+        self.assertEqual([task['archived'] for task in page['objects']], [True, False])
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskETagTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_unchanged_list_not_modified(self):
+        """Requests the task list again with its ETag and checks that it's not modified."""
+        response = self.client.get('/api/tasks/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unchanged_list_not_modified_without_queries(self):
+        """Checks that a not modified response doesn't query tasks."""
+        etag = self.client.get('/api/tasks/')['ETag']
+        # Sessions and the cached user come from Redis, so nothing is queried.
+        with self.assertNumQueries(0):
+            self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+
+    def test_changed_list_modified(self):
+        """Marks a task current and checks that the previous ETag no longer matches."""
+        etag = self.client.get('/api/tasks/')['ETag']
+        self.reminder.set_current(True)
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_saved_task_changes_etag(self):
+        """Renames a task and checks that the detail ETag changes."""
+        task_uri = '/api/tasks/{pk}/'.format(pk=self.reminder.pk)
+        etag = self.client.get(task_uri)['ETag']
+        self.reminder.title = 'Renamed'
+        self.reminder.save()
+        self.assertNotEqual(self.client.get(task_uri)['ETag'], etag)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskBatchTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def post_batch(self, changes):
+        return self.client.post('/api/tasks/batch/', json.dumps({'objects': changes}), content_type='application/json')
+
+    @patch('tasks.models.schedule_archival')
+    def test_batch_marks_tasks_done(self, mock_schedule_archival):
+        """Marks both tasks done in one request and checks that both are done and archival is scheduled once."""
+        response = self.post_batch([
+            {'id': self.reminder.pk, 'done': True},
+            {'id': self.routine.pk, 'done': True},
+        ])
+        self.assertEqual(response.status_code, 200)
+        objects = json.loads(response.content)['objects']
+        self.assertEqual(sorted(task['id'] for task in objects), [self.reminder.pk, self.routine.pk])
+        self.assertTrue(all(task['current'] and task['done'] for task in objects))
+        mock_schedule_archival.assert_called_once_with(self.user.pk)
+        self.assertTrue(self.reminder.is_done())
+        self.assertTrue(self.routine.is_current())
+
+    def test_batch_marks_tasks_current(self):
+        """Marks one task current and another not current and checks both."""
+        self.routine.set_current(True)
+        self.post_batch([
+            {'id': self.reminder.pk, 'current': True},
+            {'id': self.routine.pk, 'current': False},
+        ])
+        self.assertTrue(self.reminder.is_current())
+        self.assertFalse(self.routine.is_current())
+
+    def test_batch_ignores_other_users_tasks(self):
+        """Tries to mark another user's task current and checks that it's unchanged."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_task = other_user.tasks.create(title='Other')
+        response = self.post_batch([{'id': other_task.pk, 'current': True}])
+        self.assertEqual(json.loads(response.content)['objects'], [])
+        self.assertFalse(other_task.is_current())
+
+    def test_batch_requires_ids(self):
+        """Posts a change without a task id and checks that it's a bad request."""
+        self.assertEqual(self.post_batch([{'current': True}]).status_code, 400)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskStreaksTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_streaks(self):
+        """Records days a routine was done and checks the streaks and calendar for that month."""
+        get_backend().set_done_days({self.routine.pk: [day_number(datetime(2014, 3, day).date()) for day in (3, 4, 5, 9)]})
+        response = self.client.get('/api/tasks/{pk}/streaks/'.format(pk=self.routine.pk), {'month': '2014-03'})
+        self.assertEqual(response.status_code, 200)
+        completion = json.loads(response.content)
+        self.assertEqual(completion['longest_streak'], 3)
+        self.assertEqual(completion['month'], '2014-03')
+        self.assertEqual(completion['days'], [3, 4, 5, 9])
+
+    def test_streaks_invalid_month(self):
+        """Requests streaks for a malformed month and checks that it's a bad request."""
+        response = self.client.get('/api/tasks/{pk}/streaks/'.format(pk=self.routine.pk), {'month': 'March'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaks_of_other_users_task(self):
+        """Requests streaks for another user's task and checks that it isn't found."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_task = other_user.tasks.create(title='Other', is_repeatable=True)
+        response = self.client.get('/api/tasks/{pk}/streaks/'.format(pk=other_task.pk))
+        self.assertEqual(response.status_code, 404)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskSearchTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.title_match = self.user.tasks.create(title='Water the plants', description='Balcony only')
+        self.description_match = self.user.tasks.create(title='Chores', description='Vacuum and water the garden')
+        self.user.tasks.create(title='Read a book', description='')
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def search(self, **params):
+        return self.client.get('/api/tasks/search/', params)
+
+    def test_search_ranks_title_matches_first(self):
+        """Searches for a word in one task's title and another's description and checks the order."""
+        objects = json.loads(self.search(q='watering').content)['objects']
+        self.assertEqual([task['id'] for task in objects], [self.title_match.pk, self.description_match.pk])
+
+    def test_search_index_follows_edits(self):
+        """Renames a task and checks that it's found by its new title only."""
+        self.title_match.title = 'Feed the cat'
+        self.title_match.save()
+        self.assertEqual([task['id'] for task in json.loads(self.search(q='cat').content)['objects']], [self.title_match.pk])
+        self.assertEqual([task['id'] for task in json.loads(self.search(q='plants').content)['objects']], [])
+
+    def test_search_pages_by_offset(self):
+        """Searches with a page size of one and checks that the next offset returns the second match."""
+        page = json.loads(self.search(q='water', limit=1).content)
+        self.assertEqual([task['id'] for task in page['objects']], [self.title_match.pk])
+        page = json.loads(self.search(q='water', limit=1, offset=page['meta']['next']).content)
+        self.assertEqual([task['id'] for task in page['objects']], [self.description_match.pk])
+        self.assertEqual(page['meta']['next'], None)
+
+    def test_search_ignores_cursor(self):
+        """Searches with an id cursor, which search doesn't page by, and checks that it's ignored."""
+        self.assertEqual(self.search(q='water', after='abc').status_code, 200)
+
+    def test_search_excludes_other_users_tasks(self):
+        """Searches for a word only in another user's task and checks that nothing is found."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_user.tasks.create(title='Water the lawn')
+        self.assertEqual(len(json.loads(self.search(q='lawn').content)['objects']), 0)
+
+    def test_search_requires_query(self):
+        """Searches without a query and checks that it's a bad request."""
+        self.assertEqual(self.search(q=' ').status_code, 400)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskChangesTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.client.login(username='test@test.com', password='test')
+        self.version = json.loads(self.client.get('/api/tasks/').content)['meta']['version']
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def get_changes(self, since):
+        return json.loads(self.client.get('/api/tasks/changes/', {'since': since}).content)
+
+    def test_changes_since_version(self):
+        """Edits, marks and deletes tasks and checks that only those are listed as changed."""
+        other = self.user.tasks.create(title='Other')
+        self.reminder.title = 'Renamed'
+        self.reminder.save()
+        self.routine.set_done(True)
+        # Deleting clears the task's pk.
+        other_pk = other.pk
+        other.delete()
+        changes = self.get_changes(self.version)
+        self.assertEqual([(task['id'], task['title'], task['done']) for task in changes['objects']],
+                         [(self.reminder.pk, 'Renamed', False), (self.routine.pk, 'Routine', True)])
+        self.assertEqual(changes['meta']['deleted'], [other_pk])
+        self.assertFalse(changes['meta']['reset'])
+        self.assertEqual(changes['meta']['version'], get_backend().version(self.user.pk))
+        self.assertEqual(self.get_changes(changes['meta']['version'])['objects'], [])
+
+    def test_changes_excludes_other_users_tasks(self):
+        """Changes another user's task and checks that it's not listed."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_user.tasks.create(title='Other')
+        changes = self.get_changes(self.version)
+        self.assertEqual((changes['objects'], changes['meta']['deleted']), ([], []))
+
+    @override_settings(TASK_CHANGE_LOG_SIZE=1)
+    def test_trimmed_changes_reset(self):
+        """Changes more tasks than the change log keeps and checks that the client is told to reload."""
+        self.reminder.set_current(True)
+        self.routine.set_current(True)
+        changes = self.get_changes(0)
+        self.assertTrue(changes['meta']['reset'])
+        self.assertEqual(changes['objects'], [])
+
+    def test_changes_requires_since(self):
+        """Requests changes without a version and checks that it's a bad request."""
+        self.assertEqual(self.client.get('/api/tasks/changes/').status_code, 400)
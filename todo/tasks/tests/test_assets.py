@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from ..assets import FarFutureCacheMiddleware, HASHED_NAME_PATTERN, build, bundle_files, reset_manifest
+
+class AssetsTest(SimpleTestCase):
+    def setUp(self):
+        self.build_dir = os.path.join(tempfile.mkdtemp(), 'build')
+        self.settings_override = override_settings(ASSET_BUILD_DIR=self.build_dir)
+        self.settings_override.enable()
+        reset_manifest()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(os.path.dirname(self.build_dir))
+        reset_manifest()
+
+    def test_source_files_without_build(self):
+        """Checks that a bundle is included as its source files before assets are built."""
+        self.assertEqual(bundle_files('js/site.js'), list(settings.ASSET_BUNDLES['js/site.js']))
+
+    def test_build_writes_hashed_bundles(self):
+        """Builds the bundles and checks that each is written under a hashed name and used by templates."""
+        manifest = build()
+        self.assertEqual(sorted(manifest.keys()), sorted(settings.ASSET_BUNDLES.keys()))
+        for bundle_name, hashed_name in manifest.items():
+            self.assertTrue(HASHED_NAME_PATTERN.search(hashed_name))
+            self.assertTrue(os.path.exists(os.path.join(os.path.dirname(self.build_dir), hashed_name)))
+        self.assertEqual(bundle_files('js/site.js'), [manifest['js/site.js']])
+
+    def test_build_is_deterministic(self):
+        """Builds twice and checks that unchanged sources produce the same names."""
+        self.assertEqual(build(), build())
+
+    def test_far_future_cache_headers(self):
+        """Checks that only hashed static files are served with far-future cache headers."""
+        def application(environ, start_response):
+            start_response('200 OK', [('Cache-Control', 'no-cache')])
+            return ['']
+        middleware = FarFutureCacheMiddleware(application)
+        for path, cache_control in (
+            (settings.STATIC_URL + 'build/js/site.0123456789ab.js', 'public, max-age=31536000'),
+            (settings.STATIC_URL + 'js/app.js', 'no-cache'),
+        ):
+            responses = []
+            middleware({'PATH_INFO': path}, lambda status, headers, exc_info=None: responses.append(dict(headers)))
+            self.assertEqual(responses[0]['Cache-Control'], cache_control)
@@ -0,0 +1,226 @@
+import threading
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+import redis
+
+from ..backends.memory import MemoryBackend
+from ..backends.redis_backend import RECORD_CHANGES_SCRIPT, RedisBackend
+
+class BackendTestMixin(object):
+    """Tests shared by every task state backend. Subclasses set up ``self.backend``."""
+    def tearDown(self):
+        self.backend.flush()
+
+    def test_set_current(self):
+        """Marks a task current and then not current and checks its state."""
+        self.backend.set_current(1, 10, True)
+        self.assertTrue(self.backend.is_current(1, 10))
+        self.assertEqual(self.backend.current_task_ids(1), set(['10']))
+        self.backend.set_current(1, 10, False)
+        self.assertFalse(self.backend.is_current(1, 10))
+
+    def test_set_done_marks_current(self):
+        """Marks a task done and checks that it's current with the given done time."""
+        self.backend.set_done(1, 10, 1000)
+        self.assertEqual(self.backend.task_state(1, 10), (True, 1000))
+        self.backend.set_done(1, 10, None)
+        self.assertEqual(self.backend.task_state(1, 10), (True, None))
+
+    def test_state_is_per_user(self):
+        """Marks tasks for two users and checks that each user only sees their own."""
+        self.backend.set_current(1, 10, True)
+        self.backend.set_done(2, 20, 1000)
+        self.assertEqual(self.backend.current_task_ids(1), set(['10']))
+        self.assertEqual(self.backend.done_task_ids(1), set())
+        self.assertEqual(self.backend.state_task_ids([1, 2]), (set(['10', '20']), set(['20'])))
+
+    def test_set_states(self):
+        """Marks several tasks at once and checks each task's state."""
+        self.backend.set_current(1, 30, True)
+        self.backend.set_states(1, {10: (True, None), 20: (None, True), 30: (False, None)}, 1000)
+        self.assertEqual(self.backend.task_state(1, 10), (True, None))
+        self.assertEqual(self.backend.task_state(1, 20), (True, 1000))
+        self.assertEqual(self.backend.task_state(1, 30), (False, None))
+
+    def test_recently_done_task_ids(self):
+        """Checks that done task ids come newest first, up to the limit."""
+        self.backend.set_done(1, 10, 1000)
+        self.backend.set_done(1, 20, 2000)
+        self.assertEqual(self.backend.recently_done_task_ids(1, 10), ['20', '10'])
+        self.assertEqual(self.backend.recently_done_task_ids(1, 1), ['20'])
+
+    def test_version_bumped_by_changes(self):
+        """Checks that marking a task and recording a change both change the version."""
+        version = self.backend.version(1)
+        self.backend.set_current(1, 10, True)
+        self.assertTrue(self.backend.version(1) > version)
+        version = self.backend.version(1)
+        self.backend.record_changes(1, [20])
+        self.assertTrue(self.backend.version(1) > version)
+
+    def test_changes(self):
+        """Changes tasks and checks which tasks are listed as changed since each version."""
+        self.assertEqual(self.backend.changes(1, 0), (0, set()))
+        self.backend.set_current(1, 10, True)
+        self.backend.set_states(1, {20: (None, True), 30: (True, None)}, 1000)
+        self.backend.record_changes(1, [10])
+        self.backend.set_done(1, 20, 1000)
+        self.backend.snapshot_done(1)
+        self.assertEqual(self.backend.changes(1, 0), (5, set(['10', '20', '30'])))
+        self.assertEqual(self.backend.changes(1, 2), (5, set(['10', '20'])))
+        self.assertEqual(self.backend.changes(1, 5), (5, set()))
+        self.assertEqual(self.backend.changes(2, 0), (0, set()))
+
+    def test_changes_trimmed(self):
+        """Changes more tasks than the change log keeps and checks that versions before the trimmed entries need a reset."""
+        with self.settings(TASK_CHANGE_LOG_SIZE=2):
+            for task_id in (10, 20, 30):
+                self.backend.set_current(1, task_id, True)
+            self.backend.set_current(1, 20, False)
+        self.assertEqual(self.backend.changes(1, 0), (4, None))
+        self.assertEqual(self.backend.changes(1, 1), (4, set(['20', '30'])))
+        self.assertEqual(self.backend.changes(1, 5), (4, None))
+
+    def test_snapshot_clears_done_tasks(self):
+        """Snapshots done tasks and checks that they're no longer current or done."""
+        self.backend.set_done(1, 10, 1000)
+        self.backend.set_current(1, 20, True)
+        self.assertEqual(self.backend.snapshot_done(1), (False, {'10': 1000}))
+        self.assertEqual(self.backend.current_task_ids(1), set(['20']))
+        self.assertEqual(self.backend.done_task_ids(1), set())
+
+    def test_snapshot_before(self):
+        """Snapshots tasks done before a time and checks that later done tasks stay current and done."""
+        self.backend.set_done(1, 10, 1000)
+        self.backend.set_done(1, 20, 2000)
+        self.assertEqual(self.backend.snapshot_done(1, 2000), (False, {'10': 1000}))
+        self.assertEqual(self.backend.current_task_ids(1), set(['20']))
+        self.assertEqual(self.backend.done_times(1), {'20': 2000})
+
+    def test_unfinished_snapshot_resumed(self):
+        """Snapshots twice without finishing and checks that the second snapshot includes the first."""
+        self.backend.set_done(1, 10, 1000)
+        self.backend.snapshot_done(1)
+        self.backend.set_done(1, 20, 2000)
+        self.assertEqual(self.backend.snapshot_done(1), (True, {'10': 1000, '20': 2000}))
+        self.backend.finish_archival(1, ['10', '20'], True, 2, 0.5)
+        self.assertEqual(self.backend.snapshot_done(1), (False, {}))
+        stats = self.backend.archival_stats()
+        self.assertEqual((stats['runs'], stats['resumed'], stats['tasks']), (1, 1, 2))
+
+    def test_finished_archival_records_changes(self):
+        """Finishes an archival and checks that the archived tasks are listed as changed and their version is published."""
+        self.backend.set_done(1, 10, 1000)
+        self.backend.snapshot_done(1)
+        version = self.backend.version(1)
+        subscription = self.backend.subscribe(1)
+        try:
+            self.backend.finish_archival(1, ['10'], False, 1, 0.5)
+            self.assertEqual(subscription.get(), version + 1)
+        finally:
+            subscription.close()
+        self.assertEqual(self.backend.changes(1, version), (version + 1, set(['10'])))
+
+    def test_archival_schedule(self):
+        """Schedules archival and checks that it's due once its time passes and can be claimed once."""
+        self.assertFalse(self.backend.needs_archival(1))
+        self.backend.set_done(1, 10, 1000)
+        self.assertTrue(self.backend.needs_archival(1))
+        self.backend.schedule_archival(1, 100)
+        self.assertFalse(self.backend.needs_archival(1))
+        self.assertEqual(self.backend.due_archivals(99, 10), [])
+        self.assertEqual(self.backend.due_archivals(100, 10), [1])
+        self.assertTrue(self.backend.claim_archival(1))
+        self.assertFalse(self.backend.claim_archival(1))
+
+    def test_restore_states(self):
+        """Restores tasks with their own done times and checks their state and done times."""
+        version = self.backend.version(1)
+        self.backend.restore_states(1, {10: (True, None), 20: (False, 1000), 30: (False, None)})
+        self.assertEqual(self.backend.current_task_ids(1), set(['10', '20']))
+        self.assertEqual(self.backend.done_times(1), {'20': 1000})
+        self.assertEqual(self.backend.version(1), version + 1)
+
+    def test_subscribe(self):
+        """Subscribes to a user's changes and checks that the version of each of their changes arrives."""
+        subscription = self.backend.subscribe(1)
+        try:
+            self.backend.set_current(1, 10, True)
+            self.backend.set_current(2, 20, True)
+            self.backend.record_changes(1, [10])
+            self.assertEqual(subscription.get(), 1)
+            self.assertEqual(subscription.get(), 2)
+        finally:
+            subscription.close()
+
+    def test_done_days(self):
+        """Records days a task was done and checks ranges of the completion bitmap."""
+        self.backend.set_done_days({10: [0, 7, 8, 100], 20: [8]})
+        self.assertEqual(self.backend.done_days(10, 0, 100), set([0, 7, 8, 100]))
+        self.assertEqual(self.backend.done_days(10, 8, 99), set([8]))
+        self.assertEqual(self.backend.done_days(10, 101, 200), set())
+        self.backend.clear_done_days([10])
+        self.assertEqual(self.backend.done_days(10, 0, 100), set())
+        self.assertEqual(self.backend.done_days(20, 0, 100), set([8]))
+
+    def test_longest_streak(self):
+        """Records runs of days and checks the longest, including a run joined by a later day."""
+        self.backend.set_done_days({10: [0, 1, 2, 7]})
+        self.assertEqual(self.backend.longest_streak(10), 3)
+        self.backend.set_done_days({10: [3, 4, 5, 6]})
+        self.assertEqual(self.backend.longest_streak(10), 8)
+        self.backend.clear_done_days([10])
+        self.assertEqual(self.backend.longest_streak(10), 0)
+
+    def test_days_before_day_zero_skipped(self):
+        """Records days before day 0 and checks that they're left out of the bitmap."""
+        self.backend.set_done_days({10: [-8, -1, 0]})
+        self.assertEqual(self.backend.done_days(10, -10, 10), set([0]))
+        self.assertEqual(self.backend.longest_streak(10), 1)
+
+class MemoryBackendTest(BackendTestMixin, SimpleTestCase):
+    def setUp(self):
+        self.backend = MemoryBackend()
+
+    def test_concurrent_changes(self):
+        """Marks tasks current from several threads and checks that no change is lost."""
+        def mark_current(task_ids):
+            for task_id in task_ids:
+                self.backend.set_current(1, task_id, True)
+        threads = [threading.Thread(target=mark_current, args=(range(start, start + 100),)) for start in range(0, 1000, 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.backend.current_task_ids(1)), 1000)
+        self.assertEqual(self.backend.version(1), 1000)
+
+    @override_settings(TASK_EVENTS_HEARTBEAT=0.01)
+    def test_subscription_times_out(self):
+        """Waits on a subscription without changes and checks that it returns None, and nothing once closed."""
+        subscription = self.backend.subscribe(1)
+        self.assertEqual(subscription.get(), None)
+        subscription.close()
+        self.backend.set_current(1, 10, True)
+        self.assertTrue(subscription.queue.empty())
+
+@override_settings(
+    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+)
+class RedisBackendTest(BackendTestMixin, SimpleTestCase):
+    """Runs the backend tests against the test Redis server in \
+    ``TEST_REDIS_CONF``, which needs to be running. The backend relies on \
+    Lua scripts, so an in-process fake of Redis won't do."""
+    def setUp(self):
+        self.backend = RedisBackend()
+
+    def test_created_without_loading_scripts(self):
+        """Creates a backend while Redis is unreachable and checks that no scripts are loaded until they're needed."""
+        with self.settings(REDIS_POOL=redis.ConnectionPool(host='localhost', port=1)):
+            backend = RedisBackend()
+        self.assertEqual(backend.scripts, {})
+        self.backend.record_changes(1, [10])
+        self.assertEqual(self.backend.scripts.keys(), [RECORD_CHANGES_SCRIPT])
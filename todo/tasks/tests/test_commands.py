@@ -0,0 +1,41 @@
+from StringIO import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ..backends import get_backend
+from ..management.commands.load_test import LOAD_TEST_DOMAIN, percentile
+from ..models import Task
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class LoadTestCommandTest(TestCase):
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_percentile(self):
+        """Checks nearest-rank percentiles of a sorted list."""
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_load_test(self):
+        """Runs a small load test and checks that it reports every kind of request and cleans up."""
+        output = StringIO()
+        call_command('load_test', users=2, tasks=5, history=2, requests=50, stdout=output)
+        report = output.getvalue()
+        self.assertIn("Made 50 requests", report)
+        for kind in ('list', 'detail', 'current', 'done', 'all'):
+            self.assertIn(kind, report)
+        self.assertFalse(get_user_model().objects.filter(email__endswith='@' + LOAD_TEST_DOMAIN).exists())
+        self.assertFalse(Task.objects.exists())
+
+    def test_load_test_keep(self):
+        """Runs a load test with --keep and checks that the seeded tasks remain."""
+        call_command('load_test', users=2, tasks=5, history=0, requests=10, keep=True, stdout=StringIO())
+        self.assertEqual(Task.objects.count(), 10)
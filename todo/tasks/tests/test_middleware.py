@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from ..backends import get_backend
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend',
+    REQUEST_COST_SQL_SAMPLE_RATE = 1
+)
+class RequestCostMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.user.tasks.create(title='Reminder')
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_cost_headers(self):
+        """Lists tasks and checks that the response reports the queries and commands made."""
+        response = self.client.get('/api/tasks/')
+        self.assertTrue(int(response['X-SQL-Queries']) > 0)
+        self.assertTrue(int(response['X-Redis-Commands']) > 0)
+        self.assertTrue(float(response['X-SQL-Time']) >= 0)
+        self.assertTrue(float(response['X-Redis-Time']) >= 0)
+
+    @override_settings(REQUEST_COST_SQL_SAMPLE_RATE=0)
+    def test_unsampled_request_leaves_query_logging_alone(self):
+        """Lists tasks without sampling and checks that queries aren't logged and SQL costs aren't reported."""
+        with patch('tasks.middleware.connections') as mock_connections:
+            response = self.client.get('/api/tasks/')
+        self.assertFalse(mock_connections.all.called)
+        self.assertNotIn('X-SQL-Queries', response)
+        self.assertTrue(int(response['X-Redis-Commands']) > 0)
+
+    @override_settings(
+        REQUEST_BUDGETS = {'*': {'sql_queries': 100}, 'api_task_list': {'redis_commands': 0}}
+    )
+    def test_over_budget_warning(self):
+        """Lists tasks with a budget of no Redis commands and checks that a warning is logged."""
+        with patch('tasks.middleware.logger') as logger:
+            self.client.get('/api/tasks/')
+        self.assertTrue(logger.warning.called)
+        self.assertIn('redis_commands', logger.warning.call_args[0][2])
+
+    @override_settings(
+        REQUEST_BUDGETS = {'*': {'sql_queries': 100, 'redis_commands': 100}}
+    )
+    def test_within_budget(self):
+        """Lists tasks within the default budget and checks that no warning is logged."""
+        with patch('tasks.middleware.logger') as logger:
+            self.client.get('/api/tasks/')
+        self.assertFalse(logger.warning.called)
+        self.assertTrue(logger.info.called)
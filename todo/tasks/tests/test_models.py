@@ -1,4 +1,5 @@
-from datetime import datetime
+import calendar
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -6,139 +7,173 @@ from django.test import TestCase
 from django.test.utils import override_settings
 from django.utils import timezone
 
+from profiles.models import Profile
+
 from mock import patch
-import redis
+import pytz
 
-from ..models import Task, History
-from ..tasks import archive_tasks
+from ..helpers import day_number, epoch_milliseconds, last_midnight, next_midnight, schedule_archival, trailing_streak
+from ..backends import get_backend
+from ..models import Task, History, HistoryRollup
+from ..tasks import archive_tasks, rollup_history, sweep_archival
 
 @override_settings(
-    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
 )
 class TaskManagerTest(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
         self.reminder = self.user.tasks.create(title='Reminder')
-        self.routine = self.user.tasks.create(title='Routine', is_routine=True)
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
 
     def tearDown(self):
-        redis.StrictRedis(connection_pool=settings.REDIS_POOL).flushdb()
+        get_backend().flush()
 
     def test_current_reminder_in_current_query_set(self):
         """Marks a reminder as current and checks that it's in the query set of current but not later tasks."""
-        self.assertFalse(self.reminder in Task.objects.current())
-        self.assertTrue(self.reminder in Task.objects.later())
+        self.assertFalse(self.reminder in Task.objects.current(self.user.pk))
+        self.assertTrue(self.reminder in Task.objects.later(self.user.pk))
         self.reminder.set_current(True)
-        self.assertTrue(self.reminder in Task.objects.current())
-        self.assertFalse(self.reminder in Task.objects.later())
+        self.assertTrue(self.reminder in Task.objects.current(self.user.pk))
+        self.assertFalse(self.reminder in Task.objects.later(self.user.pk))
 
     def test_current_routine_in_current_query_set(self):
         """Marks a routine as current and checks that it's in the query set of current but not later tasks."""
-        self.assertFalse(self.routine in Task.objects.current())
-        self.assertTrue(self.routine in Task.objects.later())
+        self.assertFalse(self.routine in Task.objects.current(self.user.pk))
+        self.assertTrue(self.routine in Task.objects.later(self.user.pk))
         self.routine.set_current(True)
-        self.assertTrue(self.routine in Task.objects.current())
-        self.assertFalse(self.routine in Task.objects.later())
+        self.assertTrue(self.routine in Task.objects.current(self.user.pk))
+        self.assertFalse(self.routine in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_reminder_in_done_query_set(self, mock_schedule_archival):
         """Marks a reminder done and checks that it's in the query sets of done and current but not later tasks."""
-        self.assertFalse(self.reminder in Task.objects.done())
-        self.assertTrue(self.reminder in Task.objects.later())
+        self.assertFalse(self.reminder in Task.objects.done(self.user.pk))
+        self.assertTrue(self.reminder in Task.objects.later(self.user.pk))
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(self.reminder in Task.objects.done())
-        self.assertFalse(self.reminder in Task.objects.later())
+        self.assertTrue(self.reminder in Task.objects.done(self.user.pk))
+        self.assertFalse(self.reminder in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_routine_in_done_query_set(self, mock_schedule_archival):
         """Marks a routine done and checks that it's in the query sets of done and current but not later tasks."""
-        self.assertFalse(self.routine in Task.objects.done())
-        self.assertTrue(self.routine in Task.objects.later())
+        self.assertFalse(self.routine in Task.objects.done(self.user.pk))
+        self.assertTrue(self.routine in Task.objects.later(self.user.pk))
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(self.routine in Task.objects.done())
+        self.assertTrue(self.routine in Task.objects.done(self.user.pk))
         # Note that archival has not happened as this point, so task should still be current.
-        self.assertFalse(self.routine in Task.objects.later())
+        self.assertFalse(self.routine in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_reminder_and_routine_in_done_query_set(self, mock_schedule_archival):
         """Marks a reminder and a routine done and checks that both are in the query set of done tasks."""
-        self.assertFalse(self.reminder in Task.objects.done())
-        self.assertFalse(self.routine in Task.objects.done())
+        self.assertFalse(self.reminder in Task.objects.done(self.user.pk))
+        self.assertFalse(self.routine in Task.objects.done(self.user.pk))
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
+        mock_schedule_archival.reset_mock()
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(self.reminder in Task.objects.done())
-        self.assertFalse(self.reminder in Task.objects.later())
-        self.assertTrue(self.routine in Task.objects.done())
-        self.assertFalse(self.routine in Task.objects.later())
+        self.assertTrue(self.reminder in Task.objects.done(self.user.pk))
+        self.assertFalse(self.reminder in Task.objects.later(self.user.pk))
+        self.assertTrue(self.routine in Task.objects.done(self.user.pk))
+        self.assertFalse(self.routine in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_reminder_in_done_query_set_before_and_after_archival(self, mock_schedule_archival):
         """Checks that a done reminder is in the query set of done tasks before and after archival."""
-        self.assertFalse(self.reminder in Task.objects.done())
+        self.assertFalse(self.reminder in Task.objects.done(self.user.pk))
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(self.reminder in Task.objects.done())
+        self.assertTrue(self.reminder in Task.objects.done(self.user.pk))
         archive_tasks.apply(args=[self.user.pk])
-        self.assertTrue(self.reminder in Task.objects.done())
+        self.assertTrue(self.reminder in Task.objects.done(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_routine_not_in_done_query_set_after_archival(self, mock_schedule_archival):
         """Checks that a done routine is in the query set of done tasks before archival and not after."""
-        self.assertFalse(self.routine in Task.objects.done())
+        self.assertFalse(self.routine in Task.objects.done(self.user.pk))
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(self.routine in Task.objects.done())
+        self.assertTrue(self.routine in Task.objects.done(self.user.pk))
         archive_tasks.apply(args=[self.user.pk])
-        self.assertFalse(self.routine in Task.objects.done())
+        self.assertFalse(self.routine in Task.objects.done(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_reminder_not_in_later_query_set_before_or_after_archival(self, mock_schedule_archival):
         """Checks that a done reminder is not in the query set of later tasks before or after archival."""
-        self.assertTrue(self.reminder in Task.objects.later())
+        self.assertTrue(self.reminder in Task.objects.later(self.user.pk))
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertFalse(self.reminder in Task.objects.later())
+        self.assertFalse(self.reminder in Task.objects.later(self.user.pk))
         archive_tasks.apply(args=[self.user.pk])
-        self.assertFalse(self.reminder in Task.objects.later())
+        self.assertFalse(self.reminder in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_routine_in_later_query_set_after_archival(self, mock_schedule_archival):
         """Checks that a done routine is in the query set of later tasks after archival and not before."""
-        self.assertTrue(self.routine in Task.objects.later())
+        self.assertTrue(self.routine in Task.objects.later(self.user.pk))
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertFalse(self.routine in Task.objects.later())
+        self.assertFalse(self.routine in Task.objects.later(self.user.pk))
         archive_tasks.apply(args=[self.user.pk])
-        self.assertTrue(self.routine in Task.objects.later())
+        self.assertTrue(self.routine in Task.objects.later(self.user.pk))
 
     @patch('tasks.models.schedule_archival')
     def test_done_reminder_never_in_done_query_set_after_archival(self, mock_schedule_archival):
         """Checks that a reminder can never return to the set of current done tasks after archival."""
-        self.assertFalse(self.reminder.id in Task.objects.done_task_ids())
+        self.assertFalse(self.reminder.id in Task.objects.done_task_ids(self.user.pk))
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
-        self.assertTrue(str(self.reminder.id) in Task.objects.done_task_ids())
+        self.assertTrue(str(self.reminder.id) in Task.objects.done_task_ids(self.user.pk))
         archive_tasks.apply(args=[self.user.pk])
-        self.assertFalse(str(self.reminder.id) in Task.objects.done_task_ids())
+        self.assertFalse(str(self.reminder.id) in Task.objects.done_task_ids(self.user.pk))
+        self.reminder.set_done(True)
+        self.assertFalse(str(self.reminder.id) in Task.objects.current_task_ids(self.user.pk))
+        self.assertFalse(str(self.reminder.id) in Task.objects.done_task_ids(self.user.pk))
+
+    @patch('tasks.models.schedule_archival')
+    def test_state_task_ids(self, mock_schedule_archival):
+        """Checks that the current and done task ids are fetched together."""
+        self.routine.set_current(True)
         self.reminder.set_done(True)
-        self.assertFalse(str(self.reminder.id) in Task.objects.current_task_ids())
-        self.assertFalse(str(self.reminder.id) in Task.objects.done_task_ids())
+        current_tasks, done_tasks = Task.objects.state_task_ids([self.user.pk])
+        self.assertEqual(current_tasks, set([str(self.reminder.id), str(self.routine.id)]))
+        self.assertEqual(done_tasks, set([str(self.reminder.id)]))
+
+    @patch('tasks.models.schedule_archival')
+    def test_recently_done_newest_first(self, mock_schedule_archival):
+        """Marks tasks done and checks that the most recently done tasks come first, up to the limit."""
+        self.reminder.set_done(True)
+        self.routine.set_done(True)
+        # Pin the done times so the order doesn't depend on both landing in the same millisecond.
+        get_backend().set_done(self.user.pk, self.reminder.pk, 1000)
+        get_backend().set_done(self.user.pk, self.routine.pk, 2000)
+        self.assertEqual(Task.objects.recently_done(self.user.pk, 10), [self.routine, self.reminder])
+        self.assertEqual(Task.objects.recently_done(self.user.pk, 1), [self.routine])
+
+    def test_current_query_set_excludes_other_users(self):
+        """Marks another user's task as current and checks that it's not in this user's query set of current tasks."""
+        other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        other_task = other_user.tasks.create(title='Other')
+        other_task.set_current(True)
+        self.assertTrue(other_task in Task.objects.current(other_user.pk))
+        self.assertFalse(other_task in Task.objects.current(self.user.pk))
+        self.assertFalse(str(other_task.id) in Task.objects.current_task_ids(self.user.pk))
 
 @override_settings(
-    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
 )
 class TaskTest(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
         self.reminder = self.user.tasks.create(title='Reminder')
-        self.routine = self.user.tasks.create(title='Routine', is_routine=True)
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
 
     def tearDown(self):
-        redis.StrictRedis(connection_pool=settings.REDIS_POOL).flushdb()
+        get_backend().flush()
 
     def test_set_task_current(self):
         """Marks a task as current and checks that it's current."""
@@ -193,7 +228,6 @@ class TaskTest(TestCase):
         mock_schedule_archival.assert_called_once()
         self.assertTrue(self.reminder.is_current())
         archive_tasks.apply(args=[self.user.pk])
-        print redis.StrictRedis(connection_pool=settings.REDIS_POOL).hvals('user#{user_id}'.format(user_id=self.user.pk))
         self.assertFalse(self.reminder.is_current())
 
     @patch('tasks.models.schedule_archival')
@@ -269,13 +303,16 @@ class TaskTest(TestCase):
         self.assertTrue(self.routine.is_done())
 
 @override_settings(
-    REDIS_POOL = redis.ConnectionPool(**settings.TEST_REDIS_CONF)
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
 )
 class HistoryTest(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
         self.reminder = self.user.tasks.create(title='Reminder')
-        self.routine = self.user.tasks.create(title='Routine', is_routine=True)
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+
+    def tearDown(self):
+        get_backend().flush()
 
     @patch('tasks.models.schedule_archival')
     def test_history_exists_after_task_archival(self, mock_schedule_archival):
@@ -321,7 +358,9 @@ class HistoryTest(TestCase):
         self.reminder.set_done(True)
         mock_schedule_archival.assert_called_once()
         archive_tasks.apply(args=[self.user.pk])
+        mock_schedule_archival.reset_mock()
         self.reminder.set_done(True)
+        self.assertFalse(mock_schedule_archival.called)
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
         archive_tasks.apply(args=[self.user.pk])
@@ -334,7 +373,276 @@ class HistoryTest(TestCase):
         mock_schedule_archival.assert_called_once()
         archive_tasks.apply(args=[self.user.pk])
         self.assertEqual(self.routine.history.count(), 1)
+        mock_schedule_archival.reset_mock()
         self.routine.set_done(True)
         mock_schedule_archival.assert_called_once()
         archive_tasks.apply(args=[self.user.pk])
         self.assertEqual(self.routine.history.count(), 2)
+
+    @override_settings(ARCHIVE_BATCH_SIZE=1)
+    @patch('tasks.models.schedule_archival')
+    def test_history_entries_created_in_batches(self, mock_schedule_archival):
+        """Archives more tasks than fit in one batch and checks that each gets a history entry."""
+        self.reminder.set_done(True)
+        self.routine.set_done(True)
+        archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(self.reminder.history.count(), 1)
+        self.assertEqual(self.routine.history.count(), 1)
+
+    @patch('tasks.models.schedule_archival')
+    def test_deleted_task_skipped_during_archival(self, mock_schedule_archival):
+        """Deletes a done task before archival and checks that only the remaining task gets a history entry."""
+        self.reminder.set_done(True)
+        self.routine.set_done(True)
+        self.reminder.delete()
+        archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(History.objects.count(), 1)
+        self.assertEqual(self.routine.history.count(), 1)
+
+    @patch('tasks.models.schedule_archival')
+    def test_archival_resumes_staged_snapshot(self, mock_schedule_archival):
+        """Fails an archival part way and checks that the next archival writes the tasks from both days."""
+        self.routine.set_done(True)
+        with patch('tasks.tasks.write_history', side_effect=RuntimeError):
+            archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(self.routine.history.count(), 0)
+        self.reminder.set_done(True)
+        stats = get_backend().archival_stats()
+        archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(self.reminder.history.count(), 1)
+        self.assertEqual(self.routine.history.count(), 1)
+        new_stats = get_backend().archival_stats()
+        self.assertEqual(new_stats['runs'], stats['runs'] + 1)
+        self.assertEqual(new_stats['resumed'], stats['resumed'] + 1)
+        self.assertEqual(new_stats['tasks'], stats['tasks'] + 2)
+
+    @override_settings(ARCHIVE_BATCH_SIZE=1)
+    @patch('tasks.models.schedule_archival')
+    def test_resumed_archival_skips_written_entries(self, mock_schedule_archival):
+        """Fails an archival after its first batch and checks that the next archival doesn't duplicate that batch."""
+        self.reminder.set_done(True)
+        self.routine.set_done(True)
+        bulk_create = History.objects.bulk_create
+        batches = []
+        def fail_after_first_batch(entries):
+            if batches:
+                raise RuntimeError
+            batches.append(entries)
+            return bulk_create(entries)
+        with patch.object(History.objects, 'bulk_create', side_effect=fail_after_first_batch):
+            archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(History.objects.count(), 1)
+        stats = get_backend().archival_stats()
+        archive_tasks.apply(args=[self.user.pk])
+        self.assertEqual(self.reminder.history.count(), 1)
+        self.assertEqual(self.routine.history.count(), 1)
+        self.assertEqual(get_backend().archival_stats()['tasks'], stats['tasks'] + 1)
+
+    @patch('tasks.models.schedule_archival')
+    def test_history_annotations_avoid_history_queries(self, mock_schedule_archival):
+        """Checks that an annotated task answers history questions without querying history."""
+        self.routine.set_done(True)
+        archive_tasks.apply(args=[self.user.pk])
+        done_time = self.routine.history.all()[0].done_time
+        task = Task.objects.with_history().get(pk=self.routine.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(task.is_archived())
+            self.assertFalse(task.is_done())
+            self.assertEqual(task.done_time(), done_time)
+
+    @patch('tasks.models.schedule_archival')
+    def test_done_time_checks_history_once(self, mock_schedule_archival):
+        """Checks that the done time of a task that isn't annotated or archived counts its history once."""
+        self.routine.set_done(True)
+        task = Task.objects.get(pk=self.routine.pk)
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(task.done_time())
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend',
+    ARCHIVAL_JITTER = 0
+)
+class ArchivalScheduleTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        Profile.objects.create(user=self.user, timezone='Asia/Tokyo')
+        self.reminder = self.user.tasks.create(title='Reminder')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def get_scheduled_time(self):
+        return get_backend().schedule.get(self.user.pk)
+
+    def test_archival_scheduled_at_local_midnight(self):
+        """Marks a task done and checks that archival is scheduled at midnight in the user's timezone."""
+        self.reminder.set_done(True)
+        midnight = next_midnight(pytz.timezone('Asia/Tokyo'))
+        self.assertEqual(self.get_scheduled_time(), calendar.timegm(midnight.utctimetuple()))
+
+    def test_archival_not_scheduled_without_done_tasks(self):
+        """Checks that archival is not scheduled for a user without done tasks."""
+        schedule_archival(self.user.pk)
+        self.assertEqual(self.get_scheduled_time(), None)
+
+    @patch('tasks.tasks.archive_tasks')
+    def test_sweep_queues_due_users_only(self, mock_archive_tasks):
+        """Checks that a sweep only queues archival for users whose midnight has passed."""
+        self.reminder.set_done(True)
+        self.assertEqual(sweep_archival.apply().get(), 0)
+        self.assertFalse(mock_archive_tasks.delay.called)
+        get_backend().schedule_archival(self.user.pk, 0)
+        self.assertEqual(sweep_archival.apply().get(), 1)
+        mock_archive_tasks.delay.assert_called_once_with(self.user.pk, scheduled=True)
+        self.assertEqual(self.get_scheduled_time(), None)
+
+    def test_scheduled_archival_leaves_tasks_done_after_midnight(self):
+        """Archives on schedule and checks that only tasks done before local midnight are archived and the rest are scheduled."""
+        routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.reminder.set_done(True)
+        midnight = last_midnight(pytz.timezone('Asia/Tokyo'))
+        get_backend().set_done(self.user.pk, routine.pk, epoch_milliseconds(midnight) - 1)
+        get_backend().claim_archival(self.user.pk)
+        archive_tasks.apply(args=[self.user.pk], kwargs={'scheduled': True})
+        self.assertEqual(routine.history.count(), 1)
+        self.assertEqual(self.reminder.history.count(), 0)
+        self.assertTrue(self.reminder.is_done())
+        midnight = next_midnight(pytz.timezone('Asia/Tokyo'))
+        self.assertEqual(self.get_scheduled_time(), calendar.timegm(midnight.utctimetuple()))
+
+    @override_settings(ARCHIVAL_RETRY_DELAY=60)
+    @patch('tasks.tasks.time.time', return_value=1000)
+    def test_failed_scheduled_archival_rescheduled(self, mock_time):
+        """Fails a scheduled archival and checks that the user is scheduled again after the retry delay."""
+        get_backend().set_done(self.user.pk, self.reminder.pk, 1000)
+        with patch('tasks.tasks.write_history', side_effect=RuntimeError):
+            archive_tasks.apply(args=[self.user.pk], kwargs={'scheduled': True})
+        self.assertEqual(self.get_scheduled_time(), 1060)
+
+    @override_settings(ARCHIVAL_SWEEP_LIMIT=1)
+    @patch('tasks.tasks.archive_tasks')
+    def test_sweep_limit(self, mock_archive_tasks):
+        """Checks that a sweep queues no more users than the limit and leaves the rest for the next sweep."""
+        get_backend().schedule_archival(1, 0)
+        get_backend().schedule_archival(2, 0)
+        self.assertEqual(sweep_archival.apply().get(), 1)
+        self.assertEqual(len(get_backend().schedule), 1)
+        self.assertEqual(sweep_archival.apply().get(), 1)
+        self.assertEqual(len(get_backend().schedule), 0)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class CompletionTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        Profile.objects.create(user=self.user, timezone='Asia/Tokyo')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.local_timezone = pytz.timezone('Asia/Tokyo')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def get_today(self):
+        return timezone.utc.localize(datetime.utcnow()).astimezone(self.local_timezone).date()
+
+    def test_trailing_streak(self):
+        """Checks the current streak of a set of days and the day before it."""
+        self.assertEqual(trailing_streak(set([1, 2, 3, 7, 8]), 8), (2, 6))
+        # Today isn't over, so a streak ending yesterday is still current.
+        self.assertEqual(trailing_streak(set([5, 6, 7]), 8), (3, 4))
+        self.assertEqual(trailing_streak(set([5, 6]), 8), (0, 7))
+        self.assertEqual(trailing_streak(set(), 8), (0, 7))
+
+    @patch('tasks.models.STREAK_WINDOW_DAYS', 3)
+    def test_current_streak_across_windows(self):
+        """Records a streak longer than the bitmap window and checks that it's counted in full."""
+        today = day_number(self.get_today())
+        get_backend().set_done_days({self.routine.pk: range(today - 7, today)})
+        self.assertEqual(self.routine.current_streak(today), 7)
+
+    @patch('tasks.models.schedule_archival')
+    def test_archival_sets_local_done_day(self, mock_schedule_archival):
+        """Archives a routine and a reminder and checks that only the routine's local done day is recorded."""
+        self.routine.set_done(True)
+        self.reminder.set_done(True)
+        done_time = self.routine.epoch_done_time()
+        archive_tasks.apply(args=(self.user.pk,))
+        local_date = datetime.utcfromtimestamp(done_time / 1000.0).replace(tzinfo=pytz.utc).astimezone(self.local_timezone).date()
+        self.assertEqual(get_backend().done_days(self.routine.pk, 0, day_number(local_date) + 1), set([day_number(local_date)]))
+        self.assertEqual(get_backend().done_days(self.reminder.pk, 0, day_number(local_date) + 1), set())
+
+    def test_completion(self):
+        """Records a streak ending yesterday and an earlier longer one and checks the completion summary."""
+        today = self.get_today()
+        days = [today - timedelta(days=offset) for offset in (1, 2, 10, 11, 12, 13)]
+        get_backend().set_done_days({self.routine.pk: [day_number(day) for day in days]})
+        completion = self.routine.completion(today.year, today.month)
+        self.assertEqual(completion['current_streak'], 2)
+        self.assertEqual(completion['longest_streak'], 4)
+        self.assertEqual(completion['month'], today.strftime('%Y-%m'))
+        self.assertEqual(completion['days'], sorted(day.day for day in days if (day.year, day.month) == (today.year, today.month)))
+
+    @patch('tasks.models.schedule_archival')
+    def test_completion_counts_unarchived_done_time(self, mock_schedule_archival):
+        """Marks a routine done today after a streak ending yesterday and checks that today extends the streak."""
+        today = self.get_today()
+        get_backend().set_done_days({self.routine.pk: [day_number(today - timedelta(days=1))]})
+        self.routine.set_done(True)
+        self.assertEqual(self.routine.completion()['current_streak'], 2)
+
+    def test_delete_clears_done_days(self):
+        """Deletes a routine and checks that its completion bitmap is removed."""
+        get_backend().set_done_days({self.routine.pk: [day_number(self.get_today())]})
+        task_id = self.routine.pk
+        self.routine.delete()
+        self.assertEqual(get_backend().done_days(task_id, 0, day_number(self.get_today())), set())
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend',
+    HISTORY_RETENTION_DAYS = 30,
+    ARCHIVE_BATCH_SIZE = 2
+)
+class HistoryRollupTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.routine = self.user.tasks.create(title='Routine', is_repeatable=True)
+        self.reminder = self.user.tasks.create(title='Reminder')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_old_history_rolled_up_by_month(self):
+        """Rolls up a routine's old history and checks the monthly totals and that recent history is kept."""
+        old_times = [timezone.utc.localize(datetime(2014, 1, day)) for day in (1, 2, 3)] + \
+                    [timezone.utc.localize(datetime(2014, 2, day)) for day in (1, 2)]
+        recent_time = timezone.now() - timedelta(days=1)
+        for done_time in old_times + [recent_time]:
+            self.routine.history.create(done_time=done_time)
+        self.assertEqual(rollup_history.apply().get(), 5)
+        self.assertEqual(list(self.routine.history.values_list('done_time', flat=True)), [recent_time])
+        rollups = dict((rollup.month.month, rollup) for rollup in HistoryRollup.objects.filter(task=self.routine))
+        self.assertEqual((rollups[1].count, rollups[1].first_done_time, rollups[1].last_done_time), (3, old_times[0], old_times[2]))
+        self.assertEqual(rollups[2].count, 2)
+
+    def test_latest_history_kept(self):
+        """Rolls up old history and checks that each task keeps its latest entry and stays archived."""
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 1)))
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 2)))
+        self.reminder.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 1)))
+        self.assertEqual(rollup_history.apply().get(), 1)
+        self.assertEqual(self.routine.done_time(), timezone.utc.localize(datetime(2014, 1, 2)))
+        self.assertTrue(self.reminder.is_done())
+
+    def test_rollup_adds_to_existing_month(self):
+        """Rolls up history twice for the same month and checks that the totals are combined."""
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 1)))
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 5)))
+        rollup_history.apply()
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 1, 3)))
+        self.routine.history.create(done_time=timezone.utc.localize(datetime(2014, 2, 1)))
+        rollup_history.apply()
+        rollup = HistoryRollup.objects.get(task=self.routine, month=datetime(2014, 1, 1).date())
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual(rollup.last_done_time, timezone.utc.localize(datetime(2014, 1, 5)))
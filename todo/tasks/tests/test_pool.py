@@ -0,0 +1,24 @@
+from django.db import close_connection, connection, connections
+from django.test import TransactionTestCase
+
+class PooledConnectionTest(TransactionTestCase):
+    def setUp(self):
+        connections.databases['pooled'] = dict(connection.settings_dict, ENGINE='todo.postgresql_pool',
+                                               POOL={'MAX_SIZE': 1})
+
+    def tearDown(self):
+        pooled = connections['pooled']
+        pooled.close()
+        pooled.get_pool().close_all()
+        del connections._connections.pooled
+        del connections.databases['pooled']
+
+    def test_reuses_connection(self):
+        """Checks that closing the connections returns the psycopg2 connection to the pool for the next query."""
+        connections['pooled'].cursor().execute('SELECT 1')
+        psycopg2_connection = connections['pooled'].connection
+        close_connection()
+        self.assertIsNone(connections['pooled'].connection)
+        self.assertFalse(psycopg2_connection.closed)
+        connections['pooled'].cursor().execute('SELECT 1')
+        self.assertIs(connections['pooled'].connection, psycopg2_connection)
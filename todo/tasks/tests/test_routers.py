@@ -0,0 +1,55 @@
+from django.http import HttpResponse
+from django.test import SimpleTestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from ..middleware import REPLICA_PIN_COOKIE, ReplicaPinningMiddleware
+from ..models import Task
+from ..routers import ReplicaRouter, replica_state
+
+@override_settings(
+    DATABASE_REPLICAS = ['replica']
+)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.middleware = ReplicaPinningMiddleware()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        replica_state.reset()
+
+    def test_reads_outside_requests_use_primary(self):
+        """Checks that reads go to the primary when not serving a request."""
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_request_reads_use_replica(self):
+        """Serves a GET and checks that its reads go to the replica until it writes."""
+        request = self.factory.get('/')
+        self.middleware.process_request(request)
+        self.assertEqual(self.router.db_for_read(Task), 'replica')
+        self.assertEqual(self.router.db_for_write(Task), 'default')
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+        response = self.middleware.process_response(request, HttpResponse())
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_unsafe_request_reads_use_primary(self):
+        """Serves a POST and checks that its reads go to the primary."""
+        request = self.factory.post('/')
+        self.middleware.process_request(request)
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+        response = self.middleware.process_response(request, HttpResponse())
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_use_primary(self):
+        """Serves a GET from a client that wrote recently and checks that its reads go to the primary."""
+        request = self.factory.get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        self.middleware.process_request(request)
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_replicas_not_synced(self):
+        """Checks that tables are only created on the primary."""
+        self.assertFalse(self.router.allow_syncdb('replica', Task))
+        self.assertEqual(self.router.allow_syncdb('default', Task), None)
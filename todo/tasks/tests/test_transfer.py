@@ -0,0 +1,82 @@
+from datetime import datetime
+from StringIO import StringIO
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ..backends import get_backend
+from ..helpers import epoch_milliseconds
+from ..models import HistoryRollup, Task
+from ..transfer import Importer, export_lines
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TransferTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.other_user = get_user_model().objects.create_user(email='other@test.com', name='other', password='test')
+        self.routine = self.user.tasks.create(title='Routine', description='Every day', is_repeatable=True)
+        self.reminder = self.user.tasks.create(title='Reminder')
+        self.done_time = timezone.utc.localize(datetime(2014, 3, 1, 12))
+        self.routine.history.create(done_time=self.done_time)
+        HistoryRollup.objects.create(task=self.routine, month=datetime(2014, 1, 1).date(), count=5,
+                                     first_done_time=self.done_time, last_done_time=self.done_time)
+        get_backend().set_done(self.user.pk, self.routine.pk, 1000)
+        get_backend().set_current(self.user.pk, self.reminder.pk, True)
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_export_lines(self):
+        """Exports a user's tasks and checks the rows written for tasks, history and rollups."""
+        rows = [json.loads(line) for line in export_lines(self.user.pk, batch_size=1)]
+        self.assertEqual([row['type'] for row in rows], ['task', 'task', 'history', 'rollup'])
+        self.assertEqual(rows[0]['done_time'], 1000)
+        self.assertTrue(rows[1]['current'])
+        self.assertEqual(rows[2], {'type': 'history', 'task': self.routine.pk, 'done_time': epoch_milliseconds(self.done_time)})
+
+    def test_import_restores_tasks_and_state(self):
+        """Imports one user's export into another account and checks the tasks, history and state."""
+        counts = Importer(self.other_user.pk, batch_size=1).run(export_lines(self.user.pk))
+        self.assertEqual(counts, {'task': 2, 'history': 1, 'rollup': 1})
+        routine = self.other_user.tasks.get(title='Routine')
+        reminder = self.other_user.tasks.get(title='Reminder')
+        self.assertEqual(routine.description, 'Every day')
+        self.assertEqual(list(routine.history.values_list('done_time', flat=True)), [self.done_time])
+        self.assertEqual(routine.rollups.get().count, 5)
+        self.assertEqual(get_backend().done_time(self.other_user.pk, routine.pk), 1000)
+        self.assertTrue(reminder.is_current())
+        self.assertEqual(len(get_backend().done_days(routine.pk, 0, 100000)), 1)
+
+    def test_export_and_import_commands(self):
+        """Exports to a file with the command and imports the file into another account."""
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        try:
+            call_command('export_tasks', 'test@test.com', output=path)
+            output = StringIO()
+            call_command('import_tasks', 'other@test.com', input=path, stdout=output)
+        finally:
+            os.remove(path)
+        self.assertIn("Imported 2 tasks, 1 history entries and 1 rollups.", output.getvalue())
+        self.assertEqual(Task.objects.filter(user=self.other_user).count(), 2)
+
+    def test_export_view(self):
+        """Downloads the export and checks that it streams the logged in user's tasks only."""
+        self.other_user.tasks.create(title='Other')
+        self.client.login(username='test@test.com', password='test')
+        response = self.client.get('/export/')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in ''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(row['title'] for row in rows if row['type'] == 'task'), ['Reminder', 'Routine'])
+
+    def test_export_view_requires_login(self):
+        """Requests the export without logging in and checks that it redirects to the login page."""
+        self.assertEqual(self.client.get('/export/').status_code, 302)
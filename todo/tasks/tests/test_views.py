@@ -0,0 +1,82 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from ..backends import get_backend
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskIndexViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.task = self.user.tasks.create(title='</script>')
+        self.user.tasks.create(title='Later')
+        get_backend().set_current(self.user.pk, self.task.pk, True)
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def get_bootstrapped(self, response):
+        match = re.search(r'<script id="bootstrap-tasks" type="application/json">(.*?)</script>', response.content)
+        return json.loads(match.group(1))
+
+    def test_embeds_current_tasks(self):
+        """Checks that the page embeds the tasks in progress as the API would list them."""
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('</script>",', response.content)
+        self.assertEqual(self.get_bootstrapped(response), {
+            'objects': [{'id': self.task.pk, 'title': '</script>', 'repeatable': False, 'current': True, 'done': False, 'archived': False}],
+            'meta': {'next': None, 'version': get_backend().version(self.user.pk)},
+        })
+
+    def test_revalidates_by_etag(self):
+        """Checks that an unchanged page is answered with a 304 until the user's tasks change."""
+        response = self.client.get('/')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('no-store', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        get_backend().set_current(self.user.pk, self.task.pk, False)
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_bootstrapped(response)['objects'], [])
+
+    def test_requires_login(self):
+        """Checks that the page redirects to the login page without a user."""
+        self.client.logout()
+        self.assertEqual(self.client.get('/').status_code, 302)
+
+@override_settings(
+    TASK_STATE_BACKEND = 'tasks.backends.memory.MemoryBackend'
+)
+class TaskEventsViewTest(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@test.com', name='test', password='test')
+        self.client.login(username='test@test.com', password='test')
+
+    def tearDown(self):
+        get_backend().flush()
+
+    def test_streams_versions(self):
+        """Opens the stream, changes a task and checks that its version is sent without holding a database connection."""
+        response = self.client.get('/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIsNone(connection.connection)
+        events = iter(response.streaming_content)
+        self.assertTrue(next(events).endswith('event: version\ndata: 0\n\n'))
+        self.user.tasks.create(title='Task')
+        self.assertEqual(next(events), 'event: version\ndata: 1\n\n')
+        response.close()
+        self.assertEqual(get_backend().subscriptions[self.user.pk], [])
+
+    def test_requires_login(self):
+        """Checks that the stream redirects to the login page without a user."""
+        self.client.logout()
+        self.assertEqual(self.client.get('/events/').status_code, 302)
@@ -0,0 +1,195 @@
+"""Moves a user's tasks between environments as JSON Lines.
+
+An export is one JSON object per line: first every task, then every \
+history entry and monthly rollup. Tasks carry their id in the exporting \
+database and their current/done state; history entries and rollups refer \
+to tasks by that id. Times are in milliseconds since the epoch.
+
+Both directions work in batches, so memory use doesn't grow with the \
+number of rows, apart from the map of exported to imported task ids.
+
+"""
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .backends import get_backend
+from .helpers import epoch_milliseconds, from_epoch_milliseconds, local_day_number, schedule_archival, user_timezone
+from .models import History, HistoryRollup, Task
+
+def get_batch_size(batch_size=None):
+    return batch_size or getattr(settings, 'ARCHIVE_BATCH_SIZE', 500)
+
+def iterate_by_pk(queryset, batch_size):
+    """Yields the values of a values_list query set whose first value is the \
+    primary key, fetching batches ordered by primary key."""
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last_pk = rows[-1][0]
+
+def export_lines(user_id, batch_size=None):
+    """Yields the given user's tasks, history and rollups as lines of JSON."""
+    batch_size = get_batch_size(batch_size)
+    backend = get_backend()
+    current_tasks = backend.current_task_ids(user_id)
+    done_times = backend.done_times(user_id)
+    tasks = Task.objects.filter(user_id=user_id).values_list('pk', 'title', 'description', 'is_repeatable')
+    for pk, title, description, is_repeatable in iterate_by_pk(tasks, batch_size):
+        yield json.dumps({
+            'type': 'task',
+            'id': pk,
+            'title': title,
+            'description': description,
+            'repeatable': is_repeatable,
+            'current': str(pk) in current_tasks,
+            'done_time': done_times.get(str(pk)),
+        }) + '\n'
+    history = History.objects.filter(task__user_id=user_id).values_list('pk', 'task_id', 'done_time')
+    for pk, task_id, done_time in iterate_by_pk(history, batch_size):
+        yield json.dumps({
+            'type': 'history',
+            'task': task_id,
+            'done_time': epoch_milliseconds(done_time),
+        }) + '\n'
+    rollups = HistoryRollup.objects.filter(task__user_id=user_id) \
+                                   .values_list('pk', 'task_id', 'month', 'count', 'first_done_time', 'last_done_time')
+    for pk, task_id, month, count, first_done_time, last_done_time in iterate_by_pk(rollups, batch_size):
+        yield json.dumps({
+            'type': 'rollup',
+            'task': task_id,
+            'month': month.strftime('%Y-%m-%d'),
+            'count': count,
+            'first_done_time': epoch_milliseconds(first_done_time),
+            'last_done_time': epoch_milliseconds(last_done_time),
+        }) + '\n'
+
+class Importer(object):
+    """Imports lines of an export as the given user's tasks.
+
+    Rows are inserted in batches of ``batch_size``, each batch in its own \
+    transaction, and the state of each batch of tasks is restored in one \
+    round trip. History of repeatable tasks also fills in their completion \
+    bitmaps. History entries and rollups of tasks that aren't in the \
+    export are skipped.
+
+    """
+    def __init__(self, user_id, batch_size=None):
+        self.user_id = user_id
+        self.batch_size = get_batch_size(batch_size)
+        self.local_timezone = user_timezone(user_id)
+        # Exported task ids to imported task ids, and imported ids of repeatable tasks.
+        self.task_ids = {}
+        self.repeatable_ids = set()
+        self.tasks = []
+        self.history = []
+        self.rollups = []
+        self.counts = {'task': 0, 'history': 0, 'rollup': 0}
+
+    def run(self, lines):
+        """Imports the given lines and returns counts of imported rows by type."""
+        for line in lines:
+            line = line.strip()
+            if line:
+                self.add(json.loads(line))
+        self.flush()
+        schedule_archival(self.user_id)
+        return self.counts
+
+    def add(self, row):
+        if row['type'] == 'task':
+            self.tasks.append(row)
+            if len(self.tasks) >= self.batch_size:
+                self.flush_tasks()
+        elif row['type'] == 'history':
+            self.history.append(row)
+            if len(self.history) >= self.batch_size:
+                self.flush_history()
+        elif row['type'] == 'rollup':
+            self.rollups.append(row)
+            if len(self.rollups) >= self.batch_size:
+                self.flush_rollups()
+        else:
+            raise ValueError("Unknown row type: {type}".format(type=row['type']))
+
+    def flush(self):
+        self.flush_tasks()
+        self.flush_history()
+        self.flush_rollups()
+
+    def allocate_task_ids(self, count):
+        """Reserves the given number of ids from the task id sequence.
+
+        ``bulk_create`` doesn't return the ids of the rows it creates, so \
+        ids are reserved first to map exported ids to imported ones.
+
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT nextval(pg_get_serial_sequence('tasks_task', 'id')) FROM generate_series(1, %s)", [count])
+        return [row[0] for row in cursor.fetchall()]
+
+    def flush_tasks(self):
+        if not self.tasks:
+            return
+        with transaction.commit_on_success():
+            new_ids = self.allocate_task_ids(len(self.tasks))
+            new_tasks = []
+            states = {}
+            for row, new_id in zip(self.tasks, new_ids):
+                self.task_ids[row['id']] = new_id
+                if row.get('repeatable'):
+                    self.repeatable_ids.add(new_id)
+                new_tasks.append(Task(
+                    id=new_id,
+                    user_id=self.user_id,
+                    title=row['title'],
+                    description=row.get('description', ''),
+                    is_repeatable=row.get('repeatable', False)
+                ))
+                # Tasks without state are restored too, to record them as changed.
+                states[new_id] = (row.get('current', False), row.get('done_time'))
+            Task.objects.bulk_create(new_tasks)
+        get_backend().restore_states(self.user_id, states)
+        self.counts['task'] += len(new_tasks)
+        self.tasks = []
+
+    def flush_history(self):
+        # Tasks are inserted first so that history can refer to them.
+        self.flush_tasks()
+        entries = [
+            History(task_id=self.task_ids[row['task']], done_time=from_epoch_milliseconds(row['done_time']))
+            for row in self.history if row['task'] in self.task_ids
+        ]
+        with transaction.commit_on_success():
+            History.objects.bulk_create(entries)
+        # Completion bitmaps are filled in the same way as during archival.
+        task_days = {}
+        for row in self.history:
+            task_id = self.task_ids.get(row['task'])
+            if task_id in self.repeatable_ids:
+                task_days.setdefault(task_id, []).append(local_day_number(row['done_time'], self.local_timezone))
+        get_backend().set_done_days(task_days)
+        self.counts['history'] += len(entries)
+        self.history = []
+
+    def flush_rollups(self):
+        self.flush_tasks()
+        rollups = [
+            HistoryRollup(
+                task_id=self.task_ids[row['task']],
+                month=row['month'],
+                count=row['count'],
+                first_done_time=from_epoch_milliseconds(row['first_done_time']),
+                last_done_time=from_epoch_milliseconds(row['last_done_time'])
+            )
+            for row in self.rollups if row['task'] in self.task_ids
+        ]
+        with transaction.commit_on_success():
+            HistoryRollup.objects.bulk_create(rollups)
+        self.counts['rollup'] += len(rollups)
+        self.rollups = []
@@ -7,4 +7,6 @@ task_resource = TaskResource()
 
 urlpatterns = patterns('',
     url(r'^$', views.TaskIndexView.as_view(), name='index'),
+    url(r'^export/$', views.TaskExportView.as_view(), name='export'),
+    url(r'^events/$', views.TaskEventsView.as_view(), name='events'),
 )
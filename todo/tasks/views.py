@@ -1,11 +1,116 @@
-from django.views.generic import ListView
+import hashlib
+import json
+import os
 
+from django.conf import settings
+from django.contrib import messages
+from django.db import close_connection
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import etag
+from django.views.generic import ListView, View
+
+from .api import TaskResource
+from .assets import get_manifest
+from .backends import get_backend
+from .events import version_events
 from .models import Task
-from profiles.views import CacheControlMixin, LoginRequiredMixin
+from .transfer import export_lines
+from profiles.views import LoginRequiredMixin
+
+# Templates making up the index page's shell, whose changes invalidate cached pages.
+SHELL_TEMPLATES = (
+    os.path.join(settings.PROJECT_DIR, 'templates', 'base.html'),
+    os.path.join(os.path.dirname(__file__), 'templates', 'tasks', 'index.html'),
+)
+
+_shell_revision = None
+
+def shell_revision():
+    """Returns a hash of the index page's templates and built assets, computed once per process."""
+    global _shell_revision
+    if _shell_revision is None:
+        shell = hashlib.md5(json.dumps(get_manifest(), sort_keys=True))
+        for path in SHELL_TEMPLATES:
+            with open(path) as template:
+                shell.update(template.read())
+        _shell_revision = shell.hexdigest()[:12]
+    return _shell_revision
+
+def index_etag(request, *args, **kwargs):
+    """Returns the ETag of the index page for the requesting user.
+
+    The page changes when the user's tasks do, which bumps their state \
+    version, or when the shell or the CSRF token it embeds changes. Pages \
+    showing messages aren't answered conditionally, since messages are \
+    only shown once.
+
+    """
+    if not request.user.is_authenticated() or len(messages.get_messages(request)):
+        return None
+    return '{user_id}-{version}-{shell}-{token}'.format(
+        user_id=request.user.pk,
+        version=get_backend().version(request.user.pk),
+        shell=shell_revision(),
+        token=hashlib.md5(get_token(request)).hexdigest()[:8]
+    )
+
+class TaskIndexView(LoginRequiredMixin, ListView):
+    """Renders the page shell with the user's tasks in progress embedded as \
+    the JSON the task API would respond with, so the page's script renders \
+    them without another request.
+
+    The page is private to the user and revalidated on every visit; an \
+    unchanged page is answered with a 304.
 
-class TaskIndexView(CacheControlMixin, LoginRequiredMixin, ListView):
+    """
     context_object_list = 'tasks'
     template_name = 'tasks/index.html'
 
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = etag(index_etag)(super(TaskIndexView, self).dispatch)
+        response = dispatch(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
     def get_queryset(self):
-        return Task.objects.current()
+        return Task.objects.current(self.request.user.pk)
+
+    def get_context_data(self, **kwargs):
+        context = super(TaskIndexView, self).get_context_data(**kwargs)
+        tasks_json = TaskResource.bootstrap(self.request, context['object_list'])
+        # Escape characters that could end the script element the JSON is embedded in.
+        for character, escaped in (('<', '\\u003c'), ('>', '\\u003e'), ('&', '\\u0026')):
+            tasks_json = tasks_json.replace(character, escaped)
+        context['tasks_json'] = mark_safe(tasks_json)
+        return context
+
+class TaskExportView(LoginRequiredMixin, View):
+    """Streams the user's tasks and history as a JSON Lines download.
+
+    Rows are read in batches as the response is sent, so large accounts \
+    don't need to fit in memory.
+
+    """
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(export_lines(request.user.pk), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="tasks.jsonl"'
+        return response
+
+class TaskEventsView(LoginRequiredMixin, View):
+    """Streams the versions of the user's tasks as Server-Sent Events.
+
+    The stream stays open until the page closes it, so it isn't buffered \
+    by proxies or cached. Database connections are released before \
+    streaming starts instead of when the request finishes, so open pages \
+    don't hold on to pooled connections.
+
+    """
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(version_events(request.user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        close_connection()
+        return response
@@ -0,0 +1,16 @@
+"""Postgres database backend that reuses connections from a pool.
+
+Set a database's ``ENGINE`` to ``todo.postgresql_pool`` and configure the \
+pool with a ``POOL`` dictionary in the same settings:
+
+* ``MAX_SIZE``: connections each process may have open (default 10).
+* ``TIMEOUT``: seconds to wait for a connection when all are in use \
+  (default 5).
+* ``IDLE_TIMEOUT``: seconds an unused connection is kept open (default 300).
+* ``HEALTH_CHECK_INTERVAL``: seconds a connection may sit unused before it's \
+  checked with a query when taken from the pool (default 30).
+
+Django closes its connection at the end of each request and each Celery \
+task, which returns it to the pool instead.
+
+"""
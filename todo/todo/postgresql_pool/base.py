@@ -0,0 +1,67 @@
+from django.db.backends.postgresql_psycopg2.base import *
+from django.db.backends.postgresql_psycopg2.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.utils.encoding import force_str
+
+from psycopg2 import extensions
+
+from .pool import get_pool
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """Takes connections from the process's pool for the database's \
+    connection parameters and returns them when closed."""
+    def get_connection_params(self):
+        settings_dict = self.settings_dict
+        if not settings_dict['NAME']:
+            raise ImproperlyConfigured(
+                "settings.DATABASES is improperly configured. "
+                "Please supply the NAME value.")
+        conn_params = {
+            'database': settings_dict['NAME'],
+        }
+        conn_params.update(settings_dict['OPTIONS'])
+        if 'autocommit' in conn_params:
+            del conn_params['autocommit']
+        if settings_dict['USER']:
+            conn_params['user'] = settings_dict['USER']
+        if settings_dict['PASSWORD']:
+            conn_params['password'] = force_str(settings_dict['PASSWORD'])
+        if settings_dict['HOST']:
+            conn_params['host'] = settings_dict['HOST']
+        if settings_dict['PORT']:
+            conn_params['port'] = settings_dict['PORT']
+        return conn_params
+
+    def get_pool(self):
+        conn_params = self.get_connection_params()
+        time_zone = 'UTC' if settings.USE_TZ else self.settings_dict.get('TIME_ZONE')
+        time_zone_sql = self.ops.set_time_zone_sql()
+
+        def connect():
+            # Session settings outlive checkouts, so they're made once per \
+            # connection rather than each time it's taken from the pool.
+            connection = Database.connect(**conn_params)
+            connection.set_client_encoding('UTF8')
+            if time_zone and connection.get_parameter_status('TimeZone') != time_zone:
+                connection.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                connection.cursor().execute(time_zone_sql, [time_zone])
+            return connection
+        return get_pool(repr(sorted(conn_params.items())), connect, self.settings_dict.get('POOL', {}))
+
+    def _cursor(self):
+        if self.connection is None:
+            self.connection = self.get_pool().get()
+            self.connection.set_isolation_level(self.isolation_level)
+            self._get_pg_version()
+            connection_created.send(sender=self.__class__, connection=self)
+        # The connection is set up, so Django's cursor method just wraps a cursor.
+        return super(DatabaseWrapper, self)._cursor()
+
+    def close(self):
+        self.validate_thread_sharing()
+        if self.connection is not None:
+            self.get_pool().put(self.connection)
+            self.connection = None
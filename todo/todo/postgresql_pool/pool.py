@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection is returned to a full pool in time."""
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+class ConnectionPool(object):
+    """Keeps open Postgres connections for reuse within a process.
+
+    At most ``max_size`` connections are open at once, counting those in \
+    use; taking a connection from a full pool waits up to ``timeout`` \
+    seconds for one to be returned. Idle connections are closed after \
+    ``idle_timeout`` seconds, and a connection that has been idle for more \
+    than ``health_check_interval`` seconds is checked with a query before \
+    it's handed out, so connections dropped by the server or a proxy \
+    aren't used.
+
+    Locks come from ``threading``, which gevent workers patch, so greenlets \
+    wait for connections without blocking each other.
+
+    """
+    def __init__(self, connect, max_size, timeout, idle_timeout, health_check_interval):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.condition = threading.Condition()
+        # Idle connections with the time they were returned, most recent last.
+        self.idle = []
+        self.size = 0
+
+    def get(self):
+        """Returns a connection, reusing an idle one if there's one that works."""
+        deadline = time.time() + self.timeout
+        with self.condition:
+            while True:
+                self.close_expired()
+                if self.idle:
+                    connection, returned_at = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout("No database connection was free within {timeout} seconds.".format(timeout=self.timeout))
+                self.condition.wait(remaining)
+        if connection is not None:
+            if time.time() - returned_at < self.health_check_interval or self.is_usable(connection):
+                return connection
+            # Replace the broken connection, keeping its place in the pool.
+            close_quietly(connection)
+        try:
+            return self.connect()
+        except Exception:
+            self.release_slot()
+            raise
+
+    def put(self, connection):
+        """Returns a connection to the pool, or closes it if it's broken or in a transaction."""
+        if connection.closed:
+            self.release_slot()
+            return
+        try:
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.time()))
+            self.condition.notify()
+
+    def is_usable(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def discard(self, connection):
+        close_quietly(connection)
+        self.release_slot()
+
+    def release_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def close_expired(self):
+        """Closes connections that have been idle longer than the idle timeout. \
+        Expects the condition's lock to be held."""
+        cutoff = time.time() - self.idle_timeout
+        while self.idle and self.idle[0][1] < cutoff:
+            connection, returned_at = self.idle.pop(0)
+            close_quietly(connection)
+            self.size -= 1
+
+    def close_all(self):
+        """Closes every idle connection."""
+        with self.condition:
+            while self.idle:
+                connection, returned_at = self.idle.pop()
+                close_quietly(connection)
+                self.size -= 1
+            self.condition.notify_all()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(key, connect, options):
+    """Returns the pool for the given key in this process, creating it from \
+    ``options`` on first use.
+
+    Pools are kept per process, since connections can't be shared with \
+    processes forked after they were opened.
+
+    """
+    key = (os.getpid(), key)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                connect,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                idle_timeout=options.get('IDLE_TIMEOUT', 300),
+                health_check_interval=options.get('HEALTH_CHECK_INTERVAL', 30)
+            )
+        return _pools[key]
@@ -0,0 +1,56 @@
+"""Redis client shared by the apps.
+
+Clients use the connection pool in ``REDIS_POOL`` and count the commands \
+sent from the current thread in ``command_stats``, which \
+``tasks.middleware.RequestCostMiddleware`` reports for each request.
+
+"""
+import threading
+import time
+
+from django.conf import settings
+
+import redis
+from redis.client import StrictPipeline
+
+class CommandStats(threading.local):
+    """Counts the commands backends send to their store from the current thread, \
+    and the time spent waiting on them."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.duration = 0.0
+
+    def record(self, commands, duration):
+        self.commands += commands
+        self.duration += duration
+
+command_stats = CommandStats()
+
+class CountingPipeline(StrictPipeline):
+    """Pipeline that records its commands in ``command_stats`` when executed."""
+    def execute(self, raise_on_error=True):
+        commands = len(self.command_stack)
+        start_time = time.time()
+        try:
+            return super(CountingPipeline, self).execute(raise_on_error)
+        finally:
+            command_stats.record(commands, time.time() - start_time)
+
+class CountingRedis(redis.StrictRedis):
+    """Redis client that records each command it sends in ``command_stats``."""
+    def execute_command(self, *args, **options):
+        start_time = time.time()
+        try:
+            return super(CountingRedis, self).execute_command(*args, **options)
+        finally:
+            command_stats.record(1, time.time() - start_time)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+def get_client():
+    """Returns a counting client using the connection pool in ``REDIS_POOL``."""
+    return CountingRedis(connection_pool=settings.REDIS_POOL)
@@ -1,5 +1,10 @@
+from datetime import timedelta
+
+import djcelery
 from unipath import Path
 
+djcelery.setup_loader()
+
 PROJECT_DIR = Path(__file__).ancestor(3)
 
 ADMINS = (
@@ -62,6 +67,24 @@ STATICFILES_DIRS = (
     PROJECT_DIR.child('assets'),
 )
 
+# Static files bundled into one minified file each by the build_assets command.
+ASSET_BUNDLES = {
+    'css/site.css': (
+        'css/reset.css',
+        'css/style.css',
+    ),
+    'js/site.js': (
+        'js/jquery.min.js',
+        'js/json2.js',
+        'js/underscore.min.js',
+        'js/backbone.min.js',
+        'js/app.js',
+    ),
+}
+
+# Directory built bundles are written to. Must be inside one of STATICFILES_DIRS.
+ASSET_BUILD_DIR = PROJECT_DIR.child('assets', 'build')
+
 # List of finder classes that know how to find static files in
 # various locations.
 STATICFILES_FINDERS = (
@@ -81,6 +104,8 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'tasks.middleware.RequestCostMiddleware',
+    'tasks.middleware.ReplicaPinningMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -113,7 +138,9 @@ INSTALLED_APPS = (
     # 'django.contrib.admin',
     # Uncomment the next line to enable admin documentation:
     # 'django.contrib.admindocs',
+    'djcelery',
     'gunicorn',
+    'south',
     # 'django_nose',
     'profiles',
     'tasks',
@@ -154,14 +181,98 @@ LOGGING = {
             'handlers': ['mail_admins'],
             'level': 'ERROR',
             'propagate': True,
+        },
+        'tasks.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
         }
     }
 }
 
+# Aliases in DATABASES of read replicas of the default database, which
+# tasks.routers.ReplicaRouter sends requests' reads to.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['tasks.routers.ReplicaRouter']
+
+# Seconds a client's reads stay on the primary after they write, which should
+# cover the replicas' lag.
+REPLICA_PIN_SECONDS = 10
+
 AUTH_USER_MODEL = 'profiles.User'
 
+# Users loaded for each request are cached in Redis, and sessions kept there.
+AUTHENTICATION_BACKENDS = ('profiles.backends.CachedModelBackend',)
+SESSION_ENGINE = 'profiles.sessions'
+
+# Seconds a loaded user is cached for.
+USER_CACHE_TIMEOUT = 3600
+
 LOGIN_URL = '/login/'
 LOGOUT_URL = '/logout/'
 LOGIN_REDIRECT_URL = '/'
 
 TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
+
+# Number of history entries inserted per transaction when archiving done tasks.
+ARCHIVE_BATCH_SIZE = 500
+
+# Seconds between sweeps for users whose done tasks are due for archival.
+ARCHIVAL_SWEEP_INTERVAL = 60
+
+# Maximum number of users queued for archival per sweep.
+ARCHIVAL_SWEEP_LIMIT = 500
+
+# Maximum number of seconds past local midnight a user's archival is randomly delayed.
+ARCHIVAL_JITTER = 900
+
+# Seconds before a scheduled archival that failed is due again.
+ARCHIVAL_RETRY_DELAY = 300
+
+# Number of days history entries are kept before being rolled up into monthly totals.
+HISTORY_RETENTION_DAYS = 90
+
+CELERYBEAT_SCHEDULE = {
+    'sweep-archival': {
+        'task': 'tasks.tasks.sweep_archival',
+        'schedule': timedelta(seconds=ARCHIVAL_SWEEP_INTERVAL),
+    },
+    'rollup-history': {
+        'task': 'tasks.tasks.rollup_history',
+        'schedule': timedelta(days=1),
+    },
+}
+
+# Default and maximum number of tasks per page of the task list API.
+TASK_PAGE_SIZE = 100
+TASK_MAX_PAGE_SIZE = 500
+
+# Number of changed tasks kept in each user's change log for the task changes API.
+TASK_CHANGE_LOG_SIZE = 1000
+
+# Seconds the task event stream waits for a change before sending the current
+# version anyway, which keeps idle connections open through proxies.
+TASK_EVENTS_HEARTBEAT = 25
+
+# Redis connections each process may hold for task event streams, one per
+# open page.
+TASK_EVENTS_MAX_CONNECTIONS = 100
+
+# Dotted path to the class that stores task state (current and done tasks).
+# tasks.backends.memory.MemoryBackend keeps state in process for single-process deploys and tests.
+TASK_STATE_BACKEND = 'tasks.backends.redis_backend.RedisBackend'
+
+# Maximum SQL queries, SQL time (ms), Redis commands and Redis time (ms) per
+# request for each URL name, with '*' for views not listed. Requests over
+# budget are logged as warnings by tasks.middleware.RequestCostMiddleware.
+REQUEST_BUDGETS = {
+    '*': {'sql_queries': 10, 'redis_commands': 10},
+    'api_task_list': {'sql_queries': 5, 'redis_commands': 5},
+    'api_task_detail': {'sql_queries': 5, 'redis_commands': 5},
+    'api_task_changes': {'sql_queries': 5, 'redis_commands': 5},
+    'tasks:index': {'sql_queries': 5, 'redis_commands': 5},
+}
+
+# Fraction of requests whose SQL queries tasks.middleware.RequestCostMiddleware
+# counts when DEBUG is off, since counting them means logging every query.
+REQUEST_COST_SQL_SAMPLE_RATE = 0.01
@@ -36,7 +36,3 @@ TEST_REDIS_CONF['port'] = 6380
 REDIS_POOL = redis.ConnectionPool(**REDIS_CONF)
 
 BROKER_URL = "redis://{host}:{port}/{db}".format(**REDIS_CONF)
-
-BROKER_TRANSPORT_OPTIONS = {
-    'visibility_timeout': 86400
-}
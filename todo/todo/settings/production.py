@@ -1,4 +1,5 @@
 import os
+import urlparse
 
 import dj_database_url
 import redis
@@ -19,25 +20,48 @@ DATABASES = {
     }
 }
 
-REDIS_CONF = {
-    'host': 'localhost',
-    'port': 6379,
-    'db': 0
-}
+REDIS_URL = os.getenv('REDISTOGO_URL', 'redis://localhost:6379/0')
 
-REDIS_POOL = redis.ConnectionPool(**REDIS_CONF)
+# Web workers run requests in greenlets, so cap the connections each process
+# opens and make requests wait for a free connection instead of failing.
+_redis_url = urlparse.urlparse(REDIS_URL)
+REDIS_POOL = redis.BlockingConnectionPool(
+    host=_redis_url.hostname or 'localhost',
+    port=_redis_url.port or 6379,
+    db=int(_redis_url.path.lstrip('/') or 0),
+    password=_redis_url.password,
+    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 20)),
+    timeout=int(os.getenv('REDIS_POOL_TIMEOUT', 5))
+)
 
-BROKER_URL = "redis://{host}:{port}/{db}".format(**REDIS_CONF)
+# Open pages each hold a Redis connection for their event stream.
+TASK_EVENTS_MAX_CONNECTIONS = int(os.getenv('TASK_EVENTS_MAX_CONNECTIONS', 100))
 
-CELERY_RESULT_BACKEND = BROKER_URL
+BROKER_URL = REDIS_URL
 
-BROKER_TRANSPORT_OPTIONS = {
-    'visibility_timeout': 86400
-}
+CELERY_RESULT_BACKEND = BROKER_URL
 
 # Parse database configuration from $DATABASE_URL
 DATABASES['default'] =  dj_database_url.config()
 
+# Reuse connections from a pool in each web worker and Celery process instead
+# of connecting for every request and task.
+DATABASES['default']['ENGINE'] = 'todo.postgresql_pool'
+DATABASES['default']['POOL'] = {
+    'MAX_SIZE': int(os.getenv('DATABASE_POOL_SIZE', 10)),
+    'TIMEOUT': int(os.getenv('DATABASE_POOL_TIMEOUT', 5)),
+    'IDLE_TIMEOUT': int(os.getenv('DATABASE_POOL_IDLE_TIMEOUT', 300)),
+    'HEALTH_CHECK_INTERVAL': int(os.getenv('DATABASE_POOL_HEALTH_CHECK_INTERVAL', 30)),
+}
+
+# Read replicas, as space-separated database URLs.
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(os.getenv('DATABASE_REPLICA_URLS', '').split()):
+    alias = 'replica{number}'.format(number=index + 1)
+    DATABASES[alias] = dict(dj_database_url.parse(replica_url), ENGINE='todo.postgresql_pool',
+                            POOL=DATABASES['default']['POOL'], TEST_MIRROR='default')
+    DATABASE_REPLICAS.append(alias)
+
 # Honor the 'X-Forwarded-Proto' header for request.is_secure()
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
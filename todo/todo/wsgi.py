@@ -28,4 +28,6 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "todo.settings")
 from django.core.wsgi import get_wsgi_application
 from dj_static import Cling
 
-application = Cling(get_wsgi_application())
+from tasks.assets import FarFutureCacheMiddleware
+
+application = FarFutureCacheMiddleware(Cling(get_wsgi_application()))